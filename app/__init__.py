@@ -3,27 +3,74 @@ from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
 from flask_login import LoginManager
 from config import Config
+from app.schema import SchemaRegistry
+from app.table_stats import TableStats
+from app.jobs import JobQueue
+from app.changes import ChangeFeed
+from app.statements import StatementCache
+from app.passwords import PasswordHasher
+from app.user_cache import UserCache
+from app.projections import CoreProjection
+from app.compression import Compression
+from app.metrics import Metrics
+from app.engine import configure_engine, engine_options, pool_metrics_lines
+from app.replicas import ReplicaRouter, RoutingSession
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 migrate = Migrate()
 login_manager = LoginManager()
 login_manager.login_view = 'main.login'
+schema_registry = SchemaRegistry(db)
+table_stats = TableStats(db, schema_registry)
+job_queue = JobQueue(db)
+change_feed = ChangeFeed(db)
+statement_cache = StatementCache()
+password_hasher = PasswordHasher()
+user_cache = UserCache(db)
+core_projection = CoreProjection(db, schema_registry)
+compression = Compression()
+metrics = Metrics()
+replicas = ReplicaRouter()
 
 def create_app(config_class=Config):
     app = Flask(__name__)
     app.config.from_object(config_class)
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config)
 
     db.init_app(app)
+    with app.app_context():
+        configure_engine(db.engine, app.config)
+    replicas.init_app(app)
     migrate.init_app(app, db)
     login_manager.init_app(app)
+    schema_registry.init_app(app)
+    table_stats.init_app(app)
+    job_queue.init_app(app)
+    change_feed.init_app(app)
+    statement_cache.init_app(app)
+    password_hasher.init_app(app)
+    user_cache.init_app(app)
+    core_projection.init_app(app)
+    # registered first so it runs last, after metrics measured the uncompressed body
+    compression.init_app(app)
+    metrics.init_app(app)
+    metrics.add_source(schema_registry.metrics_lines)
+    metrics.add_source(pool_metrics_lines)
+    metrics.add_source(table_stats.metrics_lines)
+    metrics.add_source(job_queue.metrics_lines)
+    metrics.add_source(change_feed.metrics_lines)
+    metrics.add_source(statement_cache.metrics_lines)
+    metrics.add_source(password_hasher.metrics_lines)
+    metrics.add_source(user_cache.metrics_lines)
+    metrics.add_source(core_projection.metrics_lines)
+    metrics.add_source(compression.metrics_lines)
 
     from app.routes import bp as main_bp
     app.register_blueprint(main_bp)
-
-    from app import models
+    from app import job_handlers
 
     @login_manager.user_loader
     def load_user(user_id):
-        return models.User.query.get(int(user_id))
+        return user_cache.load(int(user_id))
 
     return app
@@ -0,0 +1,387 @@
+"""Async (ASGI) variant of the table data routes.
+
+Serves /async/get_table_data, /async/add_table_data and /async/update_table_data
+on SQLAlchemy's async engine, authenticating with the Flask session cookie and
+applying the same permission checks as the blueprint. Everything else is
+handed to `fallback`, normally the Flask app wrapped by ThreadedWsgiToAsgi
+(see asgi.py).
+"""
+import asyncio
+import json
+import logging
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qsl
+from asgiref.sync import sync_to_async
+from asgiref.wsgi import WsgiToAsgi, WsgiToAsgiInstance
+from sqlalchemy import MetaData, Table, insert, inspect, select, update
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import create_async_engine
+from werkzeug.datastructures import MultiDict
+from werkzeug.http import parse_cookie
+from app import change_feed, compression, core_projection, statement_cache
+from app.engine import configure_engine, is_memory_sqlite
+from app.models import CoreTable, CoreTableAssociation, SessionUser, TableMetadata, User
+from app.projections import READY
+from app.query import QueryError, TableQuery
+from app.serialization import dumps
+from app.statements import UnknownColumnError
+from app.table_data import core_data_by_id, core_data_statement, table_payload
+from app.table_stats import COUNT_MODES, default_count_mode, estimated_total
+
+ASYNC_DRIVERS = {
+    'sqlite': 'sqlite+aiosqlite',
+    'postgresql': 'postgresql+asyncpg',
+}
+
+ROUTES = [
+    ('GET', re.compile(r'^/async/get_table_data/(?P<table_name>[^/]+)/(?P<view_mode>[^/]+)$'), 'get_table_data'),
+    ('POST', re.compile(r'^/async/add_table_data/(?P<table_name>[^/]+)$'), 'add_table_data'),
+    ('POST', re.compile(r'^/async/update_table_data/(?P<table_name>[^/]+)$'), 'update_table_data'),
+]
+
+
+class _ThreadedWsgiInstance(WsgiToAsgiInstance):
+    def __init__(self, wsgi_application, executor):
+        super().__init__(wsgi_application)
+        self.executor = executor
+
+    async def run_wsgi_app(self, body):
+        # asgiref's run_wsgi_app body, on the pool instead of its single sync thread
+        run = WsgiToAsgiInstance.__dict__['run_wsgi_app'].func
+        await sync_to_async(run, thread_sensitive=False, executor=self.executor)(self, body)
+
+
+class ThreadedWsgiToAsgi(WsgiToAsgi):
+    """WsgiToAsgi running each request on a pool of `threads` threads.
+
+    asgiref's own wrapper is thread sensitive, so every WSGI request would
+    run one at a time on a single shared thread and a long request (an
+    export, a change stream) would hold up all the others.
+    """
+
+    def __init__(self, wsgi_application, threads=32):
+        super().__init__(wsgi_application)
+        self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='wsgi')
+
+    async def __call__(self, scope, receive, send):
+        await _ThreadedWsgiInstance(self.wsgi_application, self.executor)(scope, receive, send)
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def async_database_uri(uri):
+    url = make_url(uri)
+    driver = ASYNC_DRIVERS.get(url.get_backend_name())
+    if driver is None:
+        raise ValueError(f"No async driver configured for {url.get_backend_name()}")
+    return url.set(drivername=driver)
+
+
+class AsyncDataAPI:
+    def __init__(self, flask_app, fallback=None):
+        self.config = flask_app.config
+        self.fallback = fallback
+        self.serializer = flask_app.session_interface.get_signing_serializer(flask_app)
+        uri = self.config.get('ASYNC_SQLALCHEMY_DATABASE_URI') or async_database_uri(self.config['SQLALCHEMY_DATABASE_URI'])
+        options = {'pool_pre_ping': self.config['DB_POOL_PRE_PING']}
+        if not is_memory_sqlite(make_url(self.config['SQLALCHEMY_DATABASE_URI'])):
+            options.update(
+                pool_size=self.config['DB_POOL_SIZE'],
+                max_overflow=self.config['DB_MAX_OVERFLOW'],
+                pool_timeout=self.config['DB_POOL_TIMEOUT'],
+                pool_recycle=self.config['DB_POOL_RECYCLE'],
+            )
+        self.engine = create_async_engine(uri, **options)
+        configure_engine(self.engine.sync_engine, self.config, label='async')
+        self._tables = {}
+        self._tables_lock = threading.Lock()
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self._lifespan(receive, send)
+        if scope['type'] != 'http' or not scope['path'].startswith('/async/'):
+            if self.fallback is None:
+                return await self._send_json(send, 404, {'error': 'Not found'})
+            return await self.fallback(scope, receive, send)
+
+        try:
+            handler, params = self._match(scope)
+            user = await self._load_user(scope)
+            status, payload = await handler(user, scope, receive, **params)
+        except HTTPError as e:
+            status, payload = e.status, {'error': str(e)}
+        except QueryError as e:
+            status, payload = 400, {'error': str(e)}
+        except SQLAlchemyError as e:
+            logging.error(f"Database error in async API: {str(e)}")
+            status, payload = 500, {'error': 'Database error occurred'}
+        except Exception as e:
+            logging.error(f"Unexpected error in async API: {str(e)}")
+            status, payload = 500, {'error': 'An unexpected error occurred', 'details': str(e)}
+        await self._send_json(send, status, payload, scope)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self.engine.dispose()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    def _match(self, scope):
+        allowed = False
+        for method, pattern, name in ROUTES:
+            match = pattern.match(scope['path'])
+            if match:
+                allowed = True
+                if scope['method'] == method:
+                    return getattr(self, name), match.groupdict()
+        raise HTTPError(405 if allowed else 404, 'Method not allowed' if allowed else 'Not found')
+
+    async def _send_json(self, send, status, payload, scope=None):
+        body = dumps(payload)
+        headers = [(b'content-type', b'application/json'), (b'vary', b'Accept-Encoding')]
+        encoding = None
+        if scope is not None and len(body) >= compression.min_size:
+            accept = dict(scope['headers']).get(b'accept-encoding', b'').decode('latin-1')
+            encoding = compression.negotiate_header(accept)
+        if encoding is not None:
+            body = compression.compress(body, encoding)
+            headers.append((b'content-encoding', encoding.encode()))
+        headers.append((b'content-length', str(len(body)).encode()))
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': headers,
+        })
+        await send({'type': 'http.response.body', 'body': body})
+
+    async def _read_json(self, receive):
+        body = b''
+        more_body = True
+        while more_body:
+            message = await receive()
+            body += message.get('body', b'')
+            more_body = message.get('more_body', False)
+        try:
+            data = json.loads(body or b'null')
+        except json.JSONDecodeError:
+            raise HTTPError(400, 'Invalid JSON')
+        if not data:
+            raise HTTPError(400, 'No data provided')
+        return data
+
+    async def _load_user(self, scope):
+        headers = dict(scope['headers'])
+        cookies = parse_cookie(headers.get(b'cookie', b'').decode('latin-1'))
+        value = cookies.get(self.config.get('SESSION_COOKIE_NAME', 'session'))
+        try:
+            max_age = int(self.config['PERMANENT_SESSION_LIFETIME'].total_seconds())
+            user_id = int(self.serializer.loads(value, max_age=max_age).get('_user_id'))
+        except Exception:
+            raise HTTPError(401, 'Authentication required')
+        async with self.engine.connect() as connection:
+            row = (await connection.execute(
+                select(*(getattr(User, field) for field in SessionUser.FIELDS)).where(User.id == user_id)
+            )).first()
+        if row is None or not row.is_active:
+            raise HTTPError(401, 'Authentication required')
+        return SessionUser.from_row(row)
+
+    @staticmethod
+    def _reflect(connection, table_name):
+        if not inspect(connection).has_table(table_name):
+            return None
+        table = Table(table_name, MetaData(), autoload_with=connection)
+        for column in table.primary_key.columns:
+            column.nullable = False
+        return table
+
+    async def _get_table(self, table_name):
+        with self._tables_lock:
+            cached = self._tables.get(table_name)
+        if cached is not None and time.monotonic() - cached[1] <= self.config['SCHEMA_CACHE_TTL']:
+            return cached[0]
+        async with self.engine.connect() as connection:
+            table = await connection.run_sync(self._reflect, table_name)
+        if table is None:
+            raise HTTPError(404, 'Table not found')
+        with self._tables_lock:
+            self._tables[table_name] = (table, time.monotonic())
+        return table
+
+    async def _all(self, stmt):
+        async with self.engine.connect() as connection:
+            return (await connection.execute(stmt)).all()
+
+    async def _scalar(self, stmt):
+        async with self.engine.connect() as connection:
+            return (await connection.execute(stmt)).scalar()
+
+    async def _nothing(self):
+        return None
+
+    async def get_table_data(self, user, scope, receive, table_name, view_mode):
+        if not user.can_access(table_name):
+            logging.warning(f"Access denied for user {user.username} to table {table_name}")
+            raise HTTPError(403, 'Access denied')
+        table = await self._get_table(table_name)
+        columns = [column.name for column in table.columns]
+        include_core = user.can_view_core_table()
+        core_fields = CoreTable.get_fields()
+
+        if view_mode == 'form':
+            return 200, {
+                'user_fields': [col for col in columns if col != 'id'],
+                'core_fields': core_fields if include_core else []
+            }
+        if view_mode not in ('spreadsheet', 'list'):
+            raise HTTPError(400, 'Invalid view mode')
+
+        args = MultiDict(parse_qsl(scope['query_string'].decode(), keep_blank_values=True))
+        limit = args.get('limit', self.config['TABLE_PAGE_SIZE'], type=int)
+        limit = max(1, min(limit, self.config['TABLE_MAX_PAGE_SIZE']))
+        table_query = TableQuery(table, args)
+        count_mode = args.get('count')
+        if count_mode is not None and count_mode not in COUNT_MODES:
+            raise QueryError(f"Invalid count mode: {count_mode}")
+        row_estimate = None
+        if count_mode in (None, 'estimate') and not table_query.is_filtered and (count_mode == 'estimate' or table_query.is_first_page):
+            row_estimate = await self._scalar(
+                select(TableMetadata.row_estimate).where(TableMetadata.table_name == table_name)
+            )
+        if count_mode is None:
+            count_mode = default_count_mode(table_query, row_estimate)
+        total = None
+        if count_mode == 'estimate':
+            total = estimated_total(table_query, row_estimate, self.config['TABLE_STATS_EXACT_BELOW'])
+        total_estimated = total is not None
+
+        where = table_query.where_clauses()
+        order_by = table_query.order_by()
+        page_stmt = select(table).where(*where).order_by(*order_by).limit(limit + 1).offset(table_query.offset)
+        # the core query selects the same page by id, so both can run at once
+        core_stmt = None
+        if include_core:
+            page_ids = select(table.c.id).where(*where).order_by(*order_by).limit(limit + 1).offset(table_query.offset).subquery()
+            core_stmt = core_data_statement(table_name, select(page_ids.c.id))
+        rows, core_rows, counted = await asyncio.gather(
+            self._all(page_stmt),
+            self._all(core_stmt) if core_stmt is not None else self._nothing(),
+            self._scalar(table_query.count_statement()) if count_mode != 'none' and total is None else self._nothing(),
+        )
+        if counted is not None:
+            total = counted
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = table_query.encode_cursor(rows[-1]._mapping)
+        core_by_id = core_data_by_id(core_rows) if include_core else None
+        return 200, table_payload(
+            columns, rows, core_by_id, args.get('format') == 'columnar', next_cursor, total, total_estimated,
+            table_query.offset
+        )
+
+    def _check_columns(self, table, user_data):
+        if not isinstance(user_data, dict):
+            raise HTTPError(400, 'user_data must be an object')
+        try:
+            statement_cache.check_columns(table, user_data)
+        except UnknownColumnError as e:
+            raise HTTPError(400, str(e))
+
+    async def _bump_version(self, connection, *table_names):
+        await connection.execute(TableMetadata.bump_version_statement(*table_names))
+
+    async def _record_change(self, connection, table_name, row_ids, op='update'):
+        statement = change_feed.record_statement(table_name, row_ids, op)
+        if statement is not None:
+            await connection.execute(*statement)
+
+    async def _refresh_projection(self, connection, table, table_name, row_ids):
+        status = (await connection.execute(core_projection.status_statement(table_name))).scalar()
+        if status == READY:
+            for statement in core_projection.refresh_statements(table, table_name, row_ids):
+                await connection.execute(statement)
+
+    async def _refresh_projection_core(self, connection, core_ids):
+        for table_name in (await connection.execute(core_projection.ready_tables_statement())).scalars().all():
+            table = await self._get_table(table_name)
+            row_ids = core_projection.core_row_ids(table_name, core_ids)
+            for statement in core_projection.refresh_statements(table, table_name, row_ids):
+                await connection.execute(statement)
+
+    def _decode(self, data, key, default):
+        try:
+            return json.loads(data.get(key, default))
+        except (TypeError, json.JSONDecodeError):
+            raise HTTPError(400, f'Invalid JSON in {key}')
+
+    async def add_table_data(self, user, scope, receive, table_name):
+        if not user.can_edit(table_name):
+            raise HTTPError(403, 'Access denied')
+        data = await self._read_json(receive)
+        table = await self._get_table(table_name)
+        user_data = self._decode(data, 'user_data', None)
+        self._check_columns(table, user_data)
+        async with self.engine.begin() as connection:
+            result = await connection.execute(statement_cache.insert(table, user_data), user_data)
+            new_id = result.inserted_primary_key[0]
+            await self._record_change(connection, table_name, [new_id], 'insert')
+            await self._refresh_projection(connection, table, table_name, [new_id])
+            await self._bump_version(connection, table_name)
+        logging.info(f"Inserted new row with id {new_id}")
+        return 200, {'success': True, 'id': new_id}
+
+    async def update_table_data(self, user, scope, receive, table_name):
+        if not user.can_edit(table_name):
+            raise HTTPError(403, 'Access denied')
+        data = await self._read_json(receive)
+        table = await self._get_table(table_name)
+        user_data = self._decode(data, 'user_data', '{}')
+        core_data = self._decode(data, 'core_data', '{}')
+        self._check_columns(table, user_data)
+        write_core = user.can_edit_core_table() and bool(core_data)
+        core = CoreTable.__table__
+        assoc = CoreTableAssociation.__table__
+
+        async with self.engine.begin() as connection:
+            row_id = data.get('id')
+            if row_id:
+                if user_data:
+                    await connection.execute(statement_cache.update(table, user_data), statement_cache.update_params(table, user_data, row_id))
+                await self._record_change(connection, table_name, [row_id])
+                core_id = None
+                if write_core:
+                    core_id = (await connection.execute(
+                        select(assoc.c.core_id).where(assoc.c.table_name == table_name, assoc.c.table_id == row_id)
+                    )).scalar()
+                if core_id is not None:
+                    await connection.execute(update(core).where(core.c.id == core_id).values(**core_data))
+                    await connection.execute(change_feed.core_statement([core_id]))
+                    await self._refresh_projection_core(connection, [core_id])
+                    write_core = False
+            else:
+                result = await connection.execute(statement_cache.insert(table, user_data), user_data)
+                row_id = result.inserted_primary_key[0]
+                await self._record_change(connection, table_name, [row_id], 'insert')
+            if write_core:
+                core_id = (await connection.execute(insert(core).values(**core_data).returning(core.c.id))).scalar()
+                await connection.execute(insert(assoc).values(table_name=table_name, table_id=row_id, core_id=core_id))
+            await self._refresh_projection(connection, table, table_name, [row_id])
+            if user.can_edit_core_table() and core_data:
+                await self._bump_version(connection)
+            else:
+                await self._bump_version(connection, table_name)
+        return 200, {'success': True, 'id': row_id}
@@ -0,0 +1,250 @@
+import json
+import logging
+from collections import defaultdict
+from sqlalchemy import insert, update
+from sqlalchemy.exc import DBAPIError, IntegrityError
+from app import db, change_feed, core_projection, statement_cache
+from app.models import CoreTable, CoreTableAssociation, TableMetadata
+from app.schema import required_columns
+
+
+class RowError(ValueError):
+    pass
+
+
+def parse_rows(request):
+    """Return a list of (row, error) pairs from a JSON array or NDJSON body."""
+    return parse_rows_data(request.get_data(), request.mimetype)
+
+
+def parse_rows_data(data, mimetype):
+    if mimetype == 'application/x-ndjson':
+        return [row for row in map(_parse_line, data.splitlines()) if row is not None]
+    data = _json_body(data, mimetype)
+    if isinstance(data, dict):
+        data = data.get('rows')
+    if not isinstance(data, list):
+        raise RowError('Expected a JSON array of rows')
+    return [(row, None) for row in data]
+
+
+def iter_rows(f, mimetype, max_json_bytes):
+    """Yield (row, error) pairs from a binary file, NDJSON one line at a time.
+
+    A JSON array has to be parsed whole, so it is refused past `max_json_bytes`.
+    """
+    if mimetype == 'application/x-ndjson':
+        for line in f:
+            row = _parse_line(line)
+            if row is not None:
+                yield row
+        return
+    data = f.read(max_json_bytes + 1)
+    if len(data) > max_json_bytes:
+        raise RowError(f'JSON bodies over {max_json_bytes} bytes must be sent as NDJSON')
+    yield from parse_rows_data(data, mimetype)
+
+
+def _parse_line(line):
+    if not line.strip():
+        return None
+    try:
+        return json.loads(line), None
+    except (json.JSONDecodeError, UnicodeDecodeError) as e:
+        return None, f'Invalid JSON: {e}'
+
+
+def _json_body(data, mimetype):
+    # same leniency as request.get_json(silent=True)
+    if not (mimetype == 'application/json' or (mimetype.startswith('application/') and mimetype.endswith('+json'))):
+        return None
+    try:
+        return json.loads(data)
+    except ValueError:
+        return None
+
+
+def _decode(value, name):
+    if value is None:
+        return {}
+    if isinstance(value, str):
+        try:
+            value = json.loads(value)
+        except json.JSONDecodeError:
+            raise RowError(f'Invalid JSON in {name}')
+    if not isinstance(value, dict):
+        raise RowError(f'{name} must be an object')
+    return value
+
+
+def validate_row(row, table, edit_core):
+    if not isinstance(row, dict):
+        raise RowError('Row must be an object')
+    row_id = row.get('id')
+    if row_id is not None:
+        try:
+            row_id = int(row_id)
+        except (TypeError, ValueError):
+            raise RowError('id must be an integer')
+    user_data = _decode(row.get('user_data'), 'user_data')
+    unknown = [key for key in user_data if key == 'id' or key not in table.c]
+    if unknown:
+        raise RowError(f"Unknown columns: {', '.join(unknown)}")
+    if row_id is None and not user_data:
+        raise RowError('No data provided')
+    if row_id is None:
+        missing = [column.name for column in required_columns(table) if column.name not in user_data]
+        if missing:
+            raise RowError(f"Missing required columns: {', '.join(missing)}")
+    nulls = [key for key, value in user_data.items() if value is None and not table.c[key].nullable]
+    if nulls:
+        raise RowError(f"Columns cannot be null: {', '.join(nulls)}")
+    core_data = _decode(row.get('core_data'), 'core_data') if edit_core else {}
+    unknown = [key for key in core_data if key not in CoreTable.get_fields()]
+    if unknown:
+        raise RowError(f"Unknown core fields: {', '.join(unknown)}")
+    return row_id, user_data, core_data
+
+
+def load_rows(table, table_name, rows, edit_core, offset=0):
+    """Validate and write (row, error) pairs from parse_rows and bump table versions.
+
+    Returns (results, written); result indexes start at `offset`. The caller commits.
+    """
+    results = [None] * len(rows)
+    valid = []
+    for index, (row, error) in enumerate(rows):
+        if error is None:
+            try:
+                valid.append((index, *validate_row(row, table, edit_core)))
+                continue
+            except RowError as e:
+                error = str(e)
+        results[index] = {'index': offset + index, 'error': error}
+
+    ids, errors = write_rows(table, table_name, valid)
+    written = [(index, row_id, core_data) for index, row_id, _, core_data in valid if index in ids]
+    if written:
+        change_feed.record(table_name, [ids[index] for index, row_id, _ in written if row_id is None], 'insert')
+        change_feed.record(table_name, [ids[index] for index, row_id, _ in written if row_id is not None])
+        core_projection.refresh(table_name, ids.values())
+        if any(core_data for _, _, core_data in written):
+            TableMetadata.bump_version()
+        else:
+            TableMetadata.bump_version(table_name)
+
+    for index, new_id in ids.items():
+        results[index] = {'index': offset + index, 'id': new_id}
+    for index, error in errors.items():
+        results[index] = {'index': offset + index, 'error': error}
+    return results, len(ids)
+
+
+def _group_by_columns(items):
+    groups = defaultdict(list)
+    for item in items:
+        groups[tuple(sorted(item[1]))].append(item)
+    return groups
+
+
+def _database_error(e):
+    logging.warning(f"Bulk row rejected by the database: {e.orig}")
+    if isinstance(e, IntegrityError):
+        return 'Row violates a table constraint'
+    return 'Row rejected by the database'
+
+
+def write_rows(table, table_name, rows):
+    """Insert or update validated rows; rows are (index, row_id, user_data, core_data).
+
+    Rows without an id are inserted, rows with an id update the existing row.
+    Everything runs as executemany batches grouped by column set inside a
+    savepoint on the current session. If the database rejects the batch it
+    is rolled back and the rows are written one savepoint each, so the error
+    is reported on the row that caused it. Returns ({index: id}, {index: error});
+    the caller commits.
+    """
+    try:
+        with db.session.begin_nested():
+            return _write_batch(table, table_name, rows)
+    except DBAPIError:
+        pass
+
+    ids = {}
+    errors = {}
+    for row in rows:
+        try:
+            with db.session.begin_nested():
+                row_ids, row_errors = _write_batch(table, table_name, [row])
+        except DBAPIError as e:
+            errors[row[0]] = _database_error(e)
+            continue
+        ids.update(row_ids)
+        errors.update(row_errors)
+    return ids, errors
+
+
+def _write_batch(table, table_name, rows):
+    ids = {}
+    errors = {}
+    update_ids = {row_id for _, row_id, _, _ in rows if row_id is not None}
+    found = set()
+    if update_ids:
+        found = set(db.session.scalars(db.select(table.c.id).where(table.c.id.in_(update_ids))))
+
+    inserts = []
+    updates = []
+    for index, row_id, user_data, _ in rows:
+        if row_id is None:
+            inserts.append((index, user_data))
+        elif row_id in found:
+            updates.append((index, user_data, row_id))
+        else:
+            errors[index] = 'Row not found'
+
+    for columns, group in _group_by_columns(inserts).items():
+        stmt = statement_cache.insert_returning(table, columns)
+        result = db.session.execute(stmt, [user_data for _, user_data in group])
+        for (index, _), new_id in zip(group, result.scalars()):
+            ids[index] = new_id
+
+    for columns, group in _group_by_columns(updates).items():
+        if columns:
+            stmt = statement_cache.update(table, columns)
+            db.session.execute(stmt, [statement_cache.update_params(table, user_data, row_id) for _, user_data, row_id in group])
+        for index, _, row_id in group:
+            ids[index] = row_id
+
+    core_rows = [(ids[index], core_data) for index, _, _, core_data in rows if core_data and index in ids]
+    if core_rows:
+        write_core_rows(table_name, core_rows)
+    return ids, errors
+
+
+def write_core_rows(table_name, core_rows):
+    """Update or create CoreTable rows for (table_id, core_data) pairs in bulk."""
+    table_ids = [table_id for table_id, _ in core_rows]
+    existing = dict(db.session.execute(
+        db.select(CoreTableAssociation.table_id, CoreTableAssociation.core_id).where(
+            CoreTableAssociation.table_name == table_name,
+            CoreTableAssociation.table_id.in_(table_ids)
+        )
+    ).all())
+
+    updates = [dict(core_data, id=existing[table_id]) for table_id, core_data in core_rows if table_id in existing]
+    if updates:
+        db.session.execute(update(CoreTable), updates)
+        # shared core rows show up in every table associated with them
+        change_feed.record_core({core['id'] for core in updates})
+        core_projection.refresh_core({core['id'] for core in updates})
+
+    created = [(table_id, core_data) for table_id, core_data in core_rows if table_id not in existing]
+    if created:
+        core_ids = db.session.scalars(
+            insert(CoreTable).returning(CoreTable.id, sort_by_parameter_order=True),
+            [core_data for _, core_data in created]
+        ).all()
+        db.session.execute(insert(CoreTableAssociation), [
+            {'table_name': table_name, 'table_id': table_id, 'core_id': core_id}
+            for (table_id, _), core_id in zip(created, core_ids)
+        ])
@@ -0,0 +1,154 @@
+import logging
+import threading
+import time
+from datetime import timedelta
+from sqlalchemy import DateTime, delete, func, insert, literal, select
+
+CHANGE_OPS = ('insert', 'update', 'reload')
+
+
+class ChangeFeed:
+    """Row-level change log for delta sync of open table views.
+
+    Writers record the row ids they touched in their own transaction; readers
+    ask for the changes after a cursor, which is a table_change id. Writes
+    touching more than `max_rows` rows log a single 'reload' marker instead.
+
+    Delivery is at least once: concurrent transactions can commit out of id
+    order, so the returned cursor stays behind changes younger than
+    `settle_seconds` and those are sent again on the next read.
+    """
+
+    PRUNE_INTERVAL = 300
+
+    def __init__(self, db, retention=86400, max_rows=1000, settle_seconds=2):
+        self.db = db
+        self.retention = retention
+        self.max_rows = max_rows
+        self.settle_seconds = settle_seconds
+        self.poll_seconds = 1
+        self.stream_seconds = 0
+        self.model = None
+        self.recorded = 0
+        self.pruned = 0
+        self._last_prune = 0.0
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        from app.models import TableChange  # app.models imports app
+        self.model = TableChange
+        self.retention = app.config.get('CHANGE_RETENTION_SECONDS', self.retention)
+        self.max_rows = app.config.get('CHANGE_FEED_MAX_ROWS', self.max_rows)
+        self.settle_seconds = app.config.get('CHANGE_FEED_SETTLE_SECONDS', self.settle_seconds)
+        self.poll_seconds = app.config.get('CHANGE_STREAM_POLL_SECONDS', self.poll_seconds)
+        self.stream_seconds = app.config.get('CHANGE_STREAM_SECONDS', self.stream_seconds)
+        app.extensions['changes'] = self
+
+    def _now(self):
+        from app.models import utcnow
+        return utcnow()
+
+    def record_statement(self, table_name, row_ids, op):
+        """(statement, parameters) logging `row_ids` of `table_name`, or None if there are none."""
+        if op not in CHANGE_OPS:
+            raise ValueError(f'Unknown change op: {op}')
+        row_ids = list(dict.fromkeys(row_ids))
+        now = self._now()
+        if op == 'reload' or len(row_ids) > self.max_rows:
+            params = [{'table_name': table_name, 'row_id': None, 'op': 'reload', 'changed_at': now}]
+        elif row_ids:
+            params = [{'table_name': table_name, 'row_id': row_id, 'op': op, 'changed_at': now} for row_id in row_ids]
+        else:
+            return None
+        with self._lock:
+            self.recorded += len(params)
+        return insert(self.model), params
+
+    def core_statement(self, core_ids):
+        """INSERT ... SELECT logging every row associated with `core_ids` as updated."""
+        from app.models import CoreTableAssociation
+        assoc = CoreTableAssociation.__table__
+        return insert(self.model).from_select(
+            ['table_name', 'row_id', 'op', 'changed_at'],
+            select(assoc.c.table_name, assoc.c.table_id, literal('update'), literal(self._now(), DateTime))
+            .where(assoc.c.core_id.in_(list(core_ids)))
+        )
+
+    def record(self, table_name, row_ids=(), op='update'):
+        """Log writes on the current session; the caller commits."""
+        statement = self.record_statement(table_name, row_ids, op)
+        if statement is not None:
+            self._maybe_prune()
+            self.db.session.execute(*statement)
+
+    def record_core(self, core_ids):
+        if core_ids:
+            self.db.session.execute(self.core_statement(core_ids))
+
+    def _maybe_prune(self):
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_prune < self.PRUNE_INTERVAL:
+                return
+            self._last_prune = now
+        Change = self.model
+        # the newest change survives so an idle feed still knows its position
+        newest = self.db.session.execute(select(func.max(Change.id))).scalar()
+        if newest is None:
+            return
+        cutoff = self._now() - timedelta(seconds=self.retention)
+        pruned = self.db.session.execute(delete(Change).where(Change.changed_at < cutoff, Change.id < newest)).rowcount
+        if pruned:
+            logging.info(f"Pruned {pruned} table changes older than {cutoff}")
+            with self._lock:
+                self.pruned += pruned
+
+    def cursor_at(self, executor, timestamp):
+        """The cursor just before the first change at or after `timestamp`."""
+        Change = self.model
+        first = executor.execute(
+            select(Change.id).where(Change.changed_at >= timestamp).order_by(Change.changed_at, Change.id).limit(1)
+        ).scalar()
+        if first is None:
+            return executor.execute(select(func.max(Change.id))).scalar() or 0
+        return first - 1
+
+    def changes_since(self, executor, table_name, since):
+        """Changes to `table_name` after cursor `since` on a session or connection.
+
+        Returns {'cursor', 'reload', 'changes'} with changes as (id, row_id, op)
+        in id order; `reload` means the client has to refetch the table.
+        """
+        Change = self.model
+        oldest, latest = executor.execute(select(func.min(Change.id), func.max(Change.id))).first()
+        latest = latest or 0
+        if since is None:
+            return {'cursor': latest, 'reload': False, 'changes': []}
+        # a cursor from the future or from before the retention window cannot be served
+        if since > latest or (oldest is not None and since + 1 < oldest):
+            return {'cursor': latest, 'reload': True, 'changes': []}
+
+        changes = executor.execute(
+            select(Change.id, Change.row_id, Change.op)
+            .where(Change.table_name == table_name, Change.id > since, Change.id <= latest)
+            .order_by(Change.id).limit(self.max_rows + 1)
+        ).all()
+        if len(changes) > self.max_rows or any(change.op == 'reload' for change in changes):
+            return {'cursor': latest, 'reload': True, 'changes': []}
+
+        settled = executor.execute(
+            select(Change.id).where(
+                Change.changed_at < self._now() - timedelta(seconds=self.settle_seconds), Change.id <= latest
+            ).order_by(Change.changed_at.desc(), Change.id.desc()).limit(1)
+        ).scalar()
+        cursor = max(since, min(settled or 0, latest))
+        return {'cursor': cursor, 'reload': False, 'changes': [tuple(change) for change in changes]}
+
+    def metrics_lines(self):
+        with self._lock:
+            return [
+                '# TYPE ncdb_table_changes_recorded_total counter',
+                f'ncdb_table_changes_recorded_total {self.recorded}',
+                '# TYPE ncdb_table_changes_pruned_total counter',
+                f'ncdb_table_changes_pruned_total {self.pruned}',
+            ]
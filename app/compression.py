@@ -0,0 +1,167 @@
+import threading
+import zlib
+from flask import request
+from werkzeug.http import parse_accept_header
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+COMPRESSIBLE_MIMETYPES = frozenset((
+    'application/json',
+    'application/x-ndjson',
+    'application/x-msgpack',
+    'application/vnd.apache.arrow.stream',
+    'text/csv',
+    'text/event-stream',
+    'text/html',
+))
+
+
+class GzipEncoder:
+    def __init__(self):
+        self._compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+
+    def compress(self, data, flush=False):
+        out = self._compressor.compress(data)
+        return out + self._compressor.flush(zlib.Z_SYNC_FLUSH) if flush else out
+
+    def finish(self):
+        return self._compressor.flush()
+
+
+class BrotliEncoder:
+    def __init__(self):
+        # quality 11 is far too slow for dynamic responses
+        self._compressor = brotli.Compressor(quality=4)
+
+    def compress(self, data, flush=False):
+        out = self._compressor.process(data)
+        return out + self._compressor.flush() if flush else out
+
+    def finish(self):
+        return self._compressor.finish()
+
+
+class ZstdEncoder:
+    def __init__(self):
+        self._compressor = zstandard.ZstdCompressor(level=3).compressobj()
+
+    def compress(self, data, flush=False):
+        out = self._compressor.compress(data)
+        return out + self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK) if flush else out
+
+    def finish(self):
+        return self._compressor.flush()
+
+
+ENCODERS = {'gzip': GzipEncoder}
+if brotli is not None:
+    ENCODERS['br'] = BrotliEncoder
+if zstandard is not None:
+    ENCODERS['zstd'] = ZstdEncoder
+
+
+class Compression:
+    """Content-Encoding negotiated from Accept-Encoding for JSON, CSV, binary and event-stream responses.
+
+    Buffered bodies under `min_size` bytes are sent as they are. Streamed
+    bodies (exports, change streams) are compressed chunk by chunk with a
+    flush after each one, so every chunk still reaches the client when it
+    is produced. `encodings` is the server's preference order; encodings
+    whose library is not installed are skipped.
+    """
+
+    def __init__(self, encodings=('zstd', 'br', 'gzip'), min_size=1024):
+        self.encodings = encodings
+        self.min_size = min_size
+        self.bytes_in = {}
+        self.bytes_out = {}
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        encodings = app.config.get('COMPRESSION_ENCODINGS', self.encodings)
+        if isinstance(encodings, str):
+            encodings = [encoding.strip() for encoding in encodings.split(',') if encoding.strip()]
+        self.encodings = tuple(encoding for encoding in encodings if encoding in ENCODERS)
+        self.min_size = app.config.get('COMPRESSION_MIN_BYTES', self.min_size)
+        app.after_request(self._after_request)
+        app.extensions['compression'] = self
+
+    def negotiate(self, accept_encodings):
+        """The preferred encoding the client accepts with the highest quality, or None."""
+        best, best_quality = None, 0
+        for encoding in self.encodings:
+            quality = accept_encodings.quality(encoding)
+            if quality > best_quality:
+                best, best_quality = encoding, quality
+        return best
+
+    def negotiate_header(self, value):
+        return self.negotiate(parse_accept_header(value))
+
+    def compress(self, data, encoding):
+        encoder = ENCODERS[encoding]()
+        body = encoder.compress(data) + encoder.finish()
+        self._count(encoding, len(data), len(body))
+        return body
+
+    def _count(self, encoding, size_in, size_out):
+        with self._lock:
+            self.bytes_in[encoding] = self.bytes_in.get(encoding, 0) + size_in
+            self.bytes_out[encoding] = self.bytes_out.get(encoding, 0) + size_out
+
+    def _stream(self, chunks, encoding):
+        encoder = ENCODERS[encoding]()
+        try:
+            for chunk in chunks:
+                if isinstance(chunk, str):
+                    chunk = chunk.encode()
+                if not chunk:
+                    continue
+                out = encoder.compress(chunk, flush=True)
+                self._count(encoding, len(chunk), len(out))
+                yield out
+            out = encoder.finish()
+            self._count(encoding, 0, len(out))
+            yield out
+        finally:
+            if hasattr(chunks, 'close'):
+                chunks.close()
+
+    def _after_request(self, response):
+        if response.mimetype not in COMPRESSIBLE_MIMETYPES or not self.encodings:
+            return response
+        response.vary.add('Accept-Encoding')
+        if (request.method == 'HEAD' or response.status_code < 200 or response.status_code in (204, 304)
+                or 'Content-Encoding' in response.headers or response.direct_passthrough):
+            return response
+        encoding = self.negotiate(request.accept_encodings)
+        if encoding is None:
+            return response
+        if response.is_streamed:
+            response.response = self._stream(response.response, encoding)
+            response.headers.pop('Content-Length', None)
+        else:
+            data = response.get_data()
+            if len(data) < self.min_size:
+                return response
+            response.set_data(self.compress(data, encoding))
+        response.headers['Content-Encoding'] = encoding
+        return response
+
+    def metrics_lines(self):
+        with self._lock:
+            lines = ['# TYPE ncdb_compression_bytes_in_total counter']
+            lines += [f'ncdb_compression_bytes_in_total{{encoding="{encoding}"}} {size}'
+                      for encoding, size in sorted(self.bytes_in.items())]
+            lines.append('# TYPE ncdb_compression_bytes_out_total counter')
+            lines += [f'ncdb_compression_bytes_out_total{{encoding="{encoding}"}} {size}'
+                      for encoding, size in sorted(self.bytes_out.items())]
+            return lines
@@ -0,0 +1,109 @@
+import threading
+import time
+import weakref
+from sqlalchemy import event, exc
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import QueuePool
+from app.metrics import Histogram
+
+WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 30)
+
+_pools = weakref.WeakSet()
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that records how long callers wait for a connection."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.label = 'default'
+        self.wait = Histogram(WAIT_BUCKETS)
+        self.timeouts = 0
+        self._stats_lock = threading.Lock()
+        _pools.add(self)
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.label = self.label
+        return pool
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            with self._stats_lock:
+                self.timeouts += 1
+            raise
+        finally:
+            with self._stats_lock:
+                self.wait.observe(time.perf_counter() - start)
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                'size': self.size(),
+                'checked_in': self.checkedin(),
+                'checked_out': self.checkedout(),
+                'overflow': self.overflow(),
+                'timeouts': self.timeouts,
+                'wait_count': self.wait.total,
+                'wait_seconds_total': self.wait.sum,
+            }
+
+
+def is_memory_sqlite(url):
+    return url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:')
+
+
+def engine_options(config, uri=None):
+    """SQLALCHEMY_ENGINE_OPTIONS built from the DB_POOL_* settings.
+
+    Anything already set in SQLALCHEMY_ENGINE_OPTIONS wins.
+    """
+    options = dict(config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+    url = make_url(uri or config['SQLALCHEMY_DATABASE_URI'])
+    options.setdefault('pool_pre_ping', config['DB_POOL_PRE_PING'])
+    if config['DB_POOL_RECYCLE'] is not None:
+        options.setdefault('pool_recycle', config['DB_POOL_RECYCLE'])
+    if not is_memory_sqlite(url):
+        # in-memory SQLite runs on a single static connection, there is no pool to size
+        options.setdefault('poolclass', TimedQueuePool)
+        options.setdefault('pool_size', config['DB_POOL_SIZE'])
+        options.setdefault('max_overflow', config['DB_MAX_OVERFLOW'])
+        options.setdefault('pool_timeout', config['DB_POOL_TIMEOUT'])
+    return options
+
+
+def configure_engine(engine, config, label='primary'):
+    if isinstance(engine.pool, TimedQueuePool):
+        engine.pool.label = label
+    if engine.dialect.name == 'sqlite' and config.get('SQLITE_PRAGMAS'):
+        pragmas = config['SQLITE_PRAGMAS']
+
+        @event.listens_for(engine, 'connect')
+        def set_sqlite_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            for name, value in pragmas.items():
+                cursor.execute(f'PRAGMA {name}={value}')
+            cursor.close()
+
+
+def pool_metrics_lines():
+    gauges, waits, timeouts = [], [], []
+    for pool in list(_pools):
+        stats = pool.stats()
+        for state in ('size', 'checked_in', 'checked_out', 'overflow'):
+            gauges.append(f'ncdb_pool_connections{{pool="{pool.label}",state="{state}"}} {stats[state]}')
+        with pool._stats_lock:
+            for bound, count in zip(pool.wait.buckets, pool.wait.counts):
+                waits.append(f'ncdb_pool_checkout_wait_seconds_bucket{{pool="{pool.label}",le="{bound}"}} {count}')
+            waits.append(f'ncdb_pool_checkout_wait_seconds_bucket{{pool="{pool.label}",le="+Inf"}} {pool.wait.total}')
+            waits.append(f'ncdb_pool_checkout_wait_seconds_sum{{pool="{pool.label}"}} {pool.wait.sum}')
+            waits.append(f'ncdb_pool_checkout_wait_seconds_count{{pool="{pool.label}"}} {pool.wait.total}')
+        timeouts.append(f'ncdb_pool_timeouts_total{{pool="{pool.label}"}} {stats["timeouts"]}')
+    return [
+        '# TYPE ncdb_pool_connections gauge', *gauges,
+        '# TYPE ncdb_pool_checkout_wait_seconds histogram', *waits,
+        '# TYPE ncdb_pool_timeouts_total counter', *timeouts,
+    ]
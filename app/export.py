@@ -0,0 +1,103 @@
+import csv
+import io
+import json
+from sqlalchemy import select
+from app import db
+from app.models import CoreTable, CoreTableAssociation
+from app.serialization import arrow_batch, arrow_schema, iter_arrow_stream, pack
+
+
+def _export_select(table, table_name, include_core):
+    if not include_core:
+        return select(table).order_by(table.c.id)
+    core = CoreTable.__table__
+    assoc = CoreTableAssociation.__table__
+    joined = table.outerjoin(
+        assoc, (assoc.c.table_name == table_name) & (assoc.c.table_id == table.c.id)
+    ).outerjoin(core, core.c.id == assoc.c.core_id)
+    core_columns = [core.c[field] for field in CoreTable.get_fields()]
+    return select(table, *core_columns).select_from(joined).order_by(table.c.id)
+
+
+def iter_table_partitions(table, table_name, include_core=False, chunk_rows=1000, progress=None):
+    """Yield lists of (user_row, core_row) tuples read through a server-side cursor.
+
+    `progress`, if given, is called with the number of rows yielded so far.
+    """
+    columns = [column.name for column in table.columns]
+    n = len(columns)
+    stmt = _export_select(table, table_name, include_core)
+    done = 0
+    with db.engine.connect() as connection:
+        result = connection.execution_options(stream_results=True, yield_per=chunk_rows).execute(stmt)
+        for partition in result.partitions():
+            yield [(dict(zip(columns, row[:n])), row[n:]) for row in partition]
+            done += len(partition)
+            if progress is not None:
+                progress(done)
+
+
+def export_ndjson(table, table_name, include_core=False, chunk_rows=1000, progress=None):
+    core_fields = CoreTable.get_fields()
+    for partition in iter_table_partitions(table, table_name, include_core, chunk_rows, progress):
+        lines = []
+        for user_row, core_row in partition:
+            record = dict(user_row)
+            if include_core:
+                record['core_data'] = dict(zip(core_fields, core_row))
+            lines.append(json.dumps(record, default=str))
+        yield '\n'.join(lines) + '\n'
+
+
+def export_csv(table, table_name, include_core=False, chunk_rows=1000, progress=None):
+    header = [column.name for column in table.columns]
+    if include_core:
+        header += [f"core_{field}" for field in CoreTable.get_fields()]
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+    for partition in iter_table_partitions(table, table_name, include_core, chunk_rows, progress):
+        for user_row, core_row in partition:
+            writer.writerow(list(user_row.values()) + list(core_row))
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def export_msgpack(table, table_name, include_core=False, chunk_rows=1000, progress=None):
+    # a sequence of maps shaped like the ndjson records, read back with msgpack.Unpacker
+    core_fields = CoreTable.get_fields()
+    for partition in iter_table_partitions(table, table_name, include_core, chunk_rows, progress):
+        chunk = bytearray()
+        for user_row, core_row in partition:
+            record = dict(user_row)
+            if include_core:
+                record['core_data'] = dict(zip(core_fields, core_row))
+            chunk += pack(record)
+        yield bytes(chunk)
+
+
+def export_arrow(table, table_name, include_core=False, chunk_rows=1000, progress=None):
+    # an Arrow IPC stream with one record batch per chunk, e.g. pyarrow.ipc.open_stream(f).read_pandas()
+    columns = list(table.columns)
+    names = [column.name for column in columns]
+    if include_core:
+        core = CoreTable.__table__
+        columns += [core.c[field] for field in CoreTable.get_fields()]
+        names += [f"core_{field}" for field in CoreTable.get_fields()]
+    schema = arrow_schema(columns, names)
+    batches = (
+        arrow_batch(schema, [(*user_row.values(), *core_row) for user_row, core_row in partition])
+        for partition in iter_table_partitions(table, table_name, include_core, chunk_rows, progress)
+    )
+    yield from iter_arrow_stream(schema, batches)
+
+
+EXPORT_FORMATS = {
+    'ndjson': (export_ndjson, 'application/x-ndjson'),
+    'csv': (export_csv, 'text/csv'),
+    'msgpack': (export_msgpack, 'application/x-msgpack'),
+    'arrow': (export_arrow, 'application/vnd.apache.arrow.stream'),
+}
@@ -0,0 +1,260 @@
+import csv
+import datetime
+import decimal
+import io
+import shutil
+import tempfile
+from sqlalchemy import insert
+from sqlalchemy.exc import DataError, IntegrityError
+from app import db, change_feed, core_projection
+from app.models import TableMetadata
+from app.schema import python_type, required_columns
+from app.serialization import arrow_type
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+IMPORT_MIMETYPES = {
+    'text/csv': 'csv',
+    'application/vnd.apache.parquet': 'parquet',
+    'application/vnd.apache.arrow.stream': 'arrow',
+}
+IMPORT_FORMATS = ('csv', 'parquet', 'arrow')
+
+
+class UploadError(ValueError):
+    pass
+
+
+def _parse_bool(value):
+    lowered = value.strip().lower()
+    if lowered in ('1', 't', 'true', 'y', 'yes'):
+        return True
+    if lowered in ('0', 'f', 'false', 'n', 'no'):
+        return False
+    raise ValueError(value)
+
+
+CONVERTERS = {
+    bool: _parse_bool,
+    int: int,
+    float: float,
+    decimal.Decimal: decimal.Decimal,
+    datetime.datetime: datetime.datetime.fromisoformat,
+    datetime.date: datetime.date.fromisoformat,
+    datetime.time: datetime.time.fromisoformat,
+}
+
+
+def map_columns(table, names):
+    """Match file column names to table columns, exactly or case-insensitively."""
+    by_lower = {column.name.lower(): column for column in table.columns}
+    columns = []
+    unknown = []
+    for name in names:
+        column = table.c.get(name)
+        if column is None:
+            column = by_lower.get(name.strip().lower())
+        if column is None:
+            unknown.append(name)
+        columns.append(column)
+    if unknown:
+        raise UploadError(f"Unknown columns: {', '.join(unknown)}")
+    if len({column.name for column in columns}) != len(columns):
+        raise UploadError('Duplicate columns in header')
+    present = {column.name for column in columns}
+    missing = [column.name for column in required_columns(table) if column.name not in present]
+    if missing:
+        raise UploadError(f"Missing required columns: {', '.join(missing)}")
+    return columns
+
+
+def coerce_text_column(column, values, first_row):
+    """Convert one column of CSV strings at once; empty strings become NULL."""
+    convert = CONVERTERS.get(python_type(column))
+    if convert is None:
+        return [value if value != '' else None for value in values]
+    try:
+        return [convert(value) if value != '' else None for value in values]
+    except (ValueError, ArithmeticError):
+        for offset, value in enumerate(values):
+            try:
+                if value != '':
+                    convert(value)
+            except (ValueError, ArithmeticError):
+                raise UploadError(f"Row {first_row + offset}, column {column.name}: invalid value {value!r}")
+        raise
+
+
+def iter_csv_batches(source, chunk_rows):
+    """Yield (header, rows) with at most `chunk_rows` string rows per batch."""
+    reader = csv.reader(io.TextIOWrapper(source, encoding='utf-8-sig', newline=''))
+    header = next(reader, None)
+    if not header:
+        raise UploadError('CSV upload has no header row')
+    rows = []
+    for row in reader:
+        if not row:
+            continue
+        if len(row) != len(header):
+            raise UploadError(f"Row {reader.line_num - 1}: expected {len(header)} fields, got {len(row)}")
+        rows.append(row)
+        if len(rows) >= chunk_rows:
+            yield header, rows
+            rows = []
+    if rows:
+        yield header, rows
+
+
+def _csv_columns(table, source, chunk_rows):
+    columns = None
+    first_row = 1
+    for header, rows in iter_csv_batches(source, chunk_rows):
+        if columns is None:
+            columns = map_columns(table, header)
+        values = [coerce_text_column(column, list(field), first_row) for column, field in zip(columns, zip(*rows))]
+        yield columns, values, len(rows)
+        first_row += len(rows)
+
+
+def _arrow_columns(table, batches):
+    columns = None
+    for batch in batches:
+        if columns is None:
+            columns = map_columns(table, batch.schema.names)
+        values = []
+        for column, array in zip(columns, batch.columns):
+            target = arrow_type(column)
+            if target is not None and array.type != target:
+                try:
+                    array = array.cast(target)
+                except (pyarrow.ArrowInvalid, pyarrow.ArrowNotImplementedError) as e:
+                    raise UploadError(f"Column {column.name}: {e}")
+            values.append(array.to_pylist())
+        yield columns, values, batch.num_rows
+
+
+def _seekable(source):
+    # Parquet keeps its metadata at the end of the file
+    if source.seekable():
+        return source
+    spooled = tempfile.TemporaryFile()
+    shutil.copyfileobj(source, spooled, 1024 * 1024)
+    spooled.seek(0)
+    return spooled
+
+
+def check_format(file_format):
+    if file_format not in IMPORT_FORMATS:
+        raise UploadError(f"Unsupported import format: {file_format}")
+    if file_format != 'csv' and pyarrow is None:
+        raise UploadError(f'{file_format} import requires pyarrow')
+
+
+def iter_column_batches(table, file_format, source, chunk_rows):
+    """Yield (columns, values per column, row count) batches coerced to the table's types."""
+    check_format(file_format)
+    if file_format == 'csv':
+        return _csv_columns(table, source, chunk_rows)
+    try:
+        if file_format == 'parquet':
+            batches = pyarrow.parquet.ParquetFile(_seekable(source)).iter_batches(batch_size=chunk_rows)
+        else:
+            batches = pyarrow.ipc.open_stream(source)
+    except pyarrow.ArrowInvalid as e:
+        raise UploadError(f'Invalid {file_format} file: {e}')
+    return _arrow_columns(table, batches)
+
+
+def _copy_value(value):
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    text = value.isoformat() if isinstance(value, (datetime.date, datetime.time)) else str(value)
+    return text.replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+
+
+def _copy_batch(connection, table, columns, values):
+    preparer = connection.dialect.identifier_preparer
+    sql = f"COPY {preparer.format_table(table)} ({', '.join(preparer.quote(column.name) for column in columns)}) FROM STDIN"
+    cursor = connection.connection.dbapi_connection.cursor()
+    try:
+        if connection.dialect.driver == 'psycopg2':
+            buffer = io.StringIO()
+            for row in zip(*values):
+                buffer.write('\t'.join(_copy_value(value) for value in row))
+                buffer.write('\n')
+            buffer.seek(0)
+            cursor.copy_expert(sql, buffer)
+        else:
+            with cursor.copy(sql) as copy:
+                for row in zip(*values):
+                    copy.write_row(row)
+    finally:
+        cursor.close()
+
+
+def write_batch(table, columns, values):
+    """Insert one column-major batch on the session's connection, by COPY on PostgreSQL."""
+    connection = db.session.connection()
+    if connection.dialect.name == 'postgresql' and connection.dialect.driver in ('psycopg2', 'psycopg'):
+        _copy_batch(connection, table, columns, values)
+    else:
+        names = [column.name for column in columns]
+        db.session.execute(insert(table), [dict(zip(names, row)) for row in zip(*values)])
+
+
+def _first_line(error):
+    return next(iter(str(error).splitlines()), type(error).__name__)
+
+
+def _write_rows(table, columns, values, first, last):
+    """write_batch with constraint and type errors reported as an UploadError naming the rows."""
+    # COPY runs on the raw driver cursor, so its errors are not wrapped by SQLAlchemy
+    driver_error = db.session.connection().dialect.loaded_dbapi.Error
+    try:
+        write_batch(table, columns, values)
+    except (IntegrityError, DataError) as e:
+        raise UploadError(f"Rows {first}-{last}: {_first_line(e.orig)}")
+    except driver_error as e:
+        raise UploadError(f"Rows {first}-{last}: {_first_line(e)}")
+
+
+def import_file(table, table_name, file_format, source, chunk_rows, commit_batches=False, progress=None):
+    """Stream `source` into `table` in batches of `chunk_rows`; returns the rows written.
+
+    With `commit_batches` every batch is its own transaction, otherwise the
+    caller commits the whole import.
+    """
+    written = 0
+    for columns, values, count in iter_column_batches(table, file_format, source, chunk_rows):
+        if not count:
+            continue
+        try:
+            _write_rows(table, columns, values, written + 1, written + count)
+        except UploadError as e:
+            if commit_batches and written:
+                raise UploadError(f"{e}; rows 1-{written} were already imported")
+            raise
+        written += count
+        if commit_batches:
+            TableMetadata.bump_version(table_name)
+            change_feed.record(table_name, op='reload')
+            core_projection.reload(table_name)
+            db.session.commit()
+        if progress is not None:
+            progress(written)
+    if not commit_batches:
+        TableMetadata.bump_version(table_name)
+        change_feed.record(table_name, op='reload')
+        core_projection.reload(table_name)
+    # rebuilt once at the end instead of re-projecting every batch
+    core_projection.sync(table_name)
+    if commit_batches:
+        db.session.commit()
+    return written
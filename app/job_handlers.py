@@ -0,0 +1,93 @@
+import itertools
+import os
+from flask import current_app
+from app import db, job_queue, schema_registry, core_projection
+from app.bulk import iter_rows, load_rows
+from app.export import EXPORT_FORMATS
+from app.importer import import_file
+from app.models import TableMetadata
+from app.sample_data import SAMPLE_TABLES, seed_sample_tables
+
+# import results keep the first errors only; the counts cover every row
+MAX_REPORTED_ERRORS = 100
+
+
+@job_queue.handler('export')
+def export_job(ctx):
+    export_format = ctx.params['format']
+    exporter, mimetype = EXPORT_FORMATS[export_format]
+    table = schema_registry.get_table(ctx.table_name)
+    estimate = db.session.execute(
+        db.select(TableMetadata.row_estimate).filter_by(table_name=ctx.table_name)
+    ).scalar()
+    ctx.progress(0, estimate, force=True)
+    rows = 0
+
+    def progress(done):
+        nonlocal rows
+        rows = done
+        ctx.progress(done)
+
+    path = ctx.path(export_format)
+    with open(path, 'wb') as f:
+        for chunk in exporter(table, ctx.table_name, ctx.params['include_core'],
+                              current_app.config['EXPORT_CHUNK_ROWS'], progress):
+            # text formats yield str, msgpack and arrow yield bytes
+            f.write(chunk.encode() if isinstance(chunk, str) else chunk)
+    ctx.progress(rows, rows, force=True)
+    return {'format': export_format, 'mimetype': mimetype, 'rows': rows, 'bytes': os.path.getsize(path)}
+
+
+@job_queue.handler('import')
+def import_job(ctx):
+    table = schema_registry.get_table(ctx.table_name)
+    chunk_rows = current_app.config['IMPORT_CHUNK_ROWS']
+    ctx.progress(0, force=True)
+    done = 0
+    written = 0
+    errors = []
+    error_count = 0
+    with open(ctx.path('upload'), 'rb') as f:
+        rows = iter_rows(f, ctx.params['mimetype'], current_app.config['IMPORT_MAX_JSON_BYTES'])
+        # each chunk commits on its own, a failure keeps the chunks before it
+        while True:
+            chunk = list(itertools.islice(rows, chunk_rows))
+            if not chunk:
+                break
+            results, chunk_written = load_rows(table, ctx.table_name, chunk, ctx.params['edit_core'], offset=done)
+            db.session.commit()
+            done += len(chunk)
+            written += chunk_written
+            for result in results:
+                if 'error' in result:
+                    error_count += 1
+                    if len(errors) < MAX_REPORTED_ERRORS:
+                        errors.append(result)
+            ctx.progress(done)
+    ctx.progress(done, done, force=True)
+    return {'rows': done, 'written': written, 'error_count': error_count, 'errors': errors}
+
+
+@job_queue.handler('import_file')
+def import_file_job(ctx):
+    table = schema_registry.get_table(ctx.table_name)
+    with open(ctx.path('upload'), 'rb') as f:
+        written = import_file(
+            table, ctx.table_name, ctx.params['format'], f, current_app.config['IMPORT_CHUNK_ROWS'],
+            commit_batches=True, progress=ctx.progress
+        )
+    ctx.progress(written, written, force=True)
+    return {'written': written}
+
+
+@job_queue.handler('seed')
+def seed_job(ctx):
+    seed_sample_tables()
+    return {'tables': SAMPLE_TABLES}
+
+
+@job_queue.handler('core_projection')
+def core_projection_job(ctx):
+    core_projection.build(ctx.table_name)
+    db.session.commit()
+    return {'core_projection': 'ready'}
@@ -0,0 +1,254 @@
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from sqlalchemy import func, select, update
+
+# jobs with an upload are 'uploading' until the file is complete; only 'queued' ones are claimed
+ACTIVE_STATUSES = ('uploading', 'queued', 'running')
+
+
+class JobLimitError(Exception):
+    pass
+
+
+class JobContext:
+    """What a job handler gets: its parameters, a scratch path and a progress callback."""
+
+    PROGRESS_INTERVAL = 0.5
+
+    def __init__(self, queue, job):
+        self.queue = queue
+        self.job_id = job.id
+        self.user_id = job.user_id
+        self.table_name = job.table_name
+        self.params = job.get_params()
+        self._last_progress = 0.0
+
+    def path(self, suffix):
+        return self.queue.path(self.job_id, suffix)
+
+    def progress(self, done, total=None, force=False):
+        # throttled, a job reporting every chunk should not turn into a write per chunk
+        now = time.monotonic()
+        if not force and now - self._last_progress < self.PROGRESS_INTERVAL:
+            return
+        self._last_progress = now
+        self.queue.update(self.job_id, progress=done, **({'total': total} if total is not None else {}))
+
+
+class JobQueue:
+    """Local background jobs: a thread pool fed from the job table, no external broker.
+
+    Handlers are registered per kind with @job_queue.handler('kind') and get a
+    JobContext; whatever they return is stored as the job result.
+
+    A monitor thread touches updated_at of the jobs this process is running
+    or uploading every `heartbeat_seconds`, fails jobs of any process whose
+    heartbeat is older than `stale_seconds`, and picks up queued jobs left
+    by a restart.
+    """
+
+    def __init__(self, db, workers=2, max_per_user=2):
+        self.db = db
+        self.workers = workers
+        self.max_per_user = max_per_user
+        self.stale_seconds = 120
+        self.heartbeat_seconds = 30
+        self.directory = None
+        self.model = None
+        self.handlers = {}
+        self.completed = 0
+        self.failed = 0
+        self._running = 0
+        self._lock = threading.Lock()
+        self._executor = None
+        self._app = None
+        self._monitor = None
+        self._stop = threading.Event()
+        # jobs this process owns: running or uploading, and submitted but not yet claimed
+        self._live = set()
+        self._pending = set()
+
+    def init_app(self, app):
+        from app.models import Job  # app.models imports app
+        self.model = Job
+        self.workers = app.config.get('JOB_WORKERS', self.workers)
+        self.max_per_user = app.config.get('JOB_MAX_PER_USER', self.max_per_user)
+        self.stale_seconds = app.config.get('JOB_STALE_SECONDS', self.stale_seconds)
+        self.heartbeat_seconds = app.config.get('JOB_HEARTBEAT_SECONDS', self.heartbeat_seconds)
+        self.directory = app.config['JOB_DIR']
+        self._app = app
+        app.extensions['jobs'] = self
+        app.before_request(self.start)
+
+    def handler(self, kind):
+        def decorator(fn):
+            self.handlers[kind] = fn
+            return fn
+        return decorator
+
+    def path(self, job_id, suffix):
+        return os.path.join(self.directory, f'{job_id}.{suffix}')
+
+    def _now(self):
+        from app.models import utcnow
+        return utcnow()
+
+    def _get_executor(self):
+        # created on first use so the pool lives in the serving process
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    os.makedirs(self.directory, exist_ok=True)
+                    self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='job')
+        return self._executor
+
+    def start(self):
+        # started from the first request rather than create_app, so the thread
+        # lives in the serving process (not a pre-fork master or a CLI command)
+        if self._monitor is not None:
+            return
+        with self._lock:
+            if self._monitor is None:
+                self._monitor = threading.Thread(target=self._watch, name='job-monitor', daemon=True)
+                self._monitor.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _watch(self):
+        while not self._stop.is_set():
+            with self._app.app_context():
+                try:
+                    self._heartbeat()
+                    self._recover()
+                except Exception as e:
+                    logging.error(f"Job recovery failed: {str(e)}")
+            self._stop.wait(self.heartbeat_seconds)
+
+    def _heartbeat(self):
+        with self._lock:
+            live = list(self._live)
+        if live:
+            Job = self.model
+            with self.db.engine.begin() as connection:
+                connection.execute(update(Job.__table__).where(
+                    Job.id.in_(live), Job.status.in_(('uploading', 'running'))
+                ).values(updated_at=self._now()))
+
+    def _recover(self):
+        # jobs whose process died stop heartbeating; queued ones are still claimable
+        Job = self.model
+        cutoff = self._now() - timedelta(seconds=self.stale_seconds)
+        with self.db.engine.begin() as connection:
+            connection.execute(update(Job.__table__).where(
+                Job.status.in_(('uploading', 'running')), Job.updated_at < cutoff
+            ).values(status='failed', error='Interrupted by a restart', finished_at=self._now()))
+            queued = connection.execute(select(Job.id).where(Job.status == 'queued').order_by(Job.id)).scalars().all()
+        for job_id in queued:
+            self._enqueue(job_id)
+
+    def _enqueue(self, job_id):
+        with self._lock:
+            if job_id in self._pending:
+                return
+            self._pending.add(job_id)
+        self._get_executor().submit(self._run, job_id)
+
+    def active_count(self, user_id):
+        Job = self.model
+        return self.db.session.execute(
+            select(func.count()).select_from(Job).where(Job.user_id == user_id, Job.status.in_(ACTIVE_STATUSES))
+        ).scalar()
+
+    def submit(self, user, kind, table_name=None, params=None, upload=None):
+        """Queue a job for `user`; `upload` is a stream saved as the job's input file."""
+        if kind not in self.handlers:
+            raise ValueError(f'Unknown job kind: {kind}')
+        if self.active_count(user.id) >= self.max_per_user:
+            raise JobLimitError(f'At most {self.max_per_user} active jobs per user')
+        job = self.model(user_id=user.id, kind=kind, table_name=table_name, params=json.dumps(params or {}),
+                         status='queued' if upload is None else 'uploading')
+        self.db.session.add(job)
+        self.db.session.commit()
+        if upload is not None:
+            with self._lock:
+                self._live.add(job.id)
+            try:
+                os.makedirs(self.directory, exist_ok=True)
+                with open(self.path(job.id, 'upload'), 'wb') as f:
+                    while True:
+                        chunk = upload.read(1024 * 1024)
+                        if not chunk:
+                            break
+                        f.write(chunk)
+            except Exception as e:
+                self.update(job.id, status='failed', error=f'Upload failed: {e}', finished_at=self._now())
+                raise
+            finally:
+                with self._lock:
+                    self._live.discard(job.id)
+            self.update(job.id, status='queued')
+            self.db.session.refresh(job)
+        self._enqueue(job.id)
+        logging.info(f"Queued {kind} job {job.id} for user {user.username}")
+        return job
+
+    def update(self, job_id, **values):
+        with self.db.engine.begin() as connection:
+            connection.execute(
+                update(self.model.__table__).where(self.model.id == job_id).values(updated_at=self._now(), **values)
+            )
+
+    def _claim(self, job_id):
+        # the status check makes a job run once even if it was submitted twice
+        with self.db.engine.begin() as connection:
+            claimed = connection.execute(update(self.model.__table__).where(
+                self.model.id == job_id, self.model.status == 'queued'
+            ).values(status='running', started_at=self._now(), updated_at=self._now())).rowcount
+        return claimed == 1
+
+    def _run(self, job_id):
+        with self._app.app_context():
+            with self._lock:
+                self._pending.discard(job_id)
+            if not self._claim(job_id):
+                return
+            job = self.db.session.get(self.model, job_id)
+            with self._lock:
+                self._running += 1
+                self._live.add(job_id)
+            try:
+                result = self.handlers[job.kind](JobContext(self, job))
+            except Exception as e:
+                self.db.session.rollback()
+                logging.error(f"Job {job_id} ({job.kind}) failed: {str(e)}")
+                self.update(job_id, status='failed', error=str(e), finished_at=self._now())
+                with self._lock:
+                    self.failed += 1
+            else:
+                self.update(job_id, status='succeeded', result=json.dumps(result, default=str), finished_at=self._now())
+                logging.info(f"Job {job_id} ({job.kind}) finished")
+                with self._lock:
+                    self.completed += 1
+            finally:
+                with self._lock:
+                    self._running -= 1
+                    self._live.discard(job_id)
+                upload = self.path(job_id, 'upload')
+                if os.path.exists(upload):
+                    os.remove(upload)
+
+    def metrics_lines(self):
+        with self._lock:
+            return [
+                '# TYPE ncdb_jobs_running gauge',
+                f'ncdb_jobs_running {self._running}',
+                '# TYPE ncdb_jobs_finished_total counter',
+                f'ncdb_jobs_finished_total{{status="succeeded"}} {self.completed}',
+                f'ncdb_jobs_finished_total{{status="failed"}} {self.failed}',
+            ]
@@ -0,0 +1,135 @@
+import logging
+import threading
+import time
+from collections import defaultdict
+from flask import g, has_app_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+STATEMENT_BUCKETS = (1, 2, 5, 10, 20, 50, 100)
+ROW_BUCKETS = (0, 1, 10, 100, 1000, 10000, 100000)
+BYTE_BUCKETS = (1024, 10240, 102400, 1048576, 10485760)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0
+        self.sum = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.total += 1
+        self.sum += value
+
+
+def _labels(**labels):
+    return ','.join(f'{key}="{value}"' for key, value in labels.items())
+
+
+class Metrics:
+    """Per-route request latency, SQL statement, row and byte histograms."""
+
+    HISTOGRAMS = {
+        'ncdb_request_duration_seconds': ('Request latency', LATENCY_BUCKETS),
+        'ncdb_request_statements': ('SQL statements executed per request', STATEMENT_BUCKETS),
+        'ncdb_request_rows': ('Rows returned per request', ROW_BUCKETS),
+        'ncdb_response_bytes': ('Serialized response size', BYTE_BUCKETS),
+    }
+
+    def __init__(self, app=None):
+        self.slow_query_threshold = 0.5
+        self._lock = threading.Lock()
+        self._histograms = {name: {} for name in self.HISTOGRAMS}
+        self._requests = defaultdict(int)
+        self._slow_queries = 0
+        self._sources = []
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.slow_query_threshold = app.config.get('SLOW_QUERY_THRESHOLD_MS', 500) / 1000
+        app.extensions['metrics'] = self
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        if not event.contains(Engine, 'before_cursor_execute', self._before_cursor_execute):
+            event.listen(Engine, 'before_cursor_execute', self._before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', self._after_cursor_execute)
+
+    def add_source(self, render):
+        # extra collectors, e.g. cache or pool stats, rendered after the built-ins
+        if render not in self._sources:
+            self._sources.append(render)
+
+    def _before_request(self):
+        g.metrics_start = time.perf_counter()
+        g.metrics_statements = 0
+        g.metrics_rows = 0
+
+    def _after_request(self, response):
+        start = g.pop('metrics_start', None)
+        if start is None:
+            return response
+        route = request.endpoint or 'unmatched'
+        with self._lock:
+            self._observe('ncdb_request_duration_seconds', route, time.perf_counter() - start)
+            self._observe('ncdb_request_statements', route, g.pop('metrics_statements', 0))
+            self._observe('ncdb_request_rows', route, g.pop('metrics_rows', 0))
+            if not response.is_streamed:
+                self._observe('ncdb_response_bytes', route, response.calculate_content_length() or 0)
+            self._requests[(route, response.status_code)] += 1
+        return response
+
+    def _observe(self, name, route, value):
+        histogram = self._histograms[name].get(route)
+        if histogram is None:
+            histogram = self._histograms[name][route] = Histogram(self.HISTOGRAMS[name][1])
+        histogram.observe(value)
+
+    def record_rows(self, count):
+        if has_app_context() and 'metrics_rows' in g:
+            g.metrics_rows += count
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        # on the execution context, which is dropped with the statement even if it fails
+        if context is not None:
+            context.metrics_query_start = time.perf_counter()
+        if has_app_context() and 'metrics_statements' in g:
+            g.metrics_statements += 1
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        start = getattr(context, 'metrics_query_start', None)
+        if start is None:
+            return
+        elapsed = time.perf_counter() - start
+        if elapsed >= self.slow_query_threshold:
+            with self._lock:
+                self._slow_queries += 1
+            logging.warning(f"Slow query ({elapsed * 1000:.1f} ms): {' '.join(statement.split())[:500]}")
+
+    def render(self):
+        lines = []
+        with self._lock:
+            for name, (help_text, _) in self.HISTOGRAMS.items():
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} histogram')
+                for route, histogram in sorted(self._histograms[name].items()):
+                    for bound, count in zip(histogram.buckets, histogram.counts):
+                        lines.append(f'{name}_bucket{{{_labels(route=route, le=bound)}}} {count}')
+                    lines.append(f'{name}_bucket{{{_labels(route=route, le="+Inf")}}} {histogram.total}')
+                    lines.append(f'{name}_sum{{{_labels(route=route)}}} {histogram.sum}')
+                    lines.append(f'{name}_count{{{_labels(route=route)}}} {histogram.total}')
+            lines.append('# HELP ncdb_requests_total Requests by route and status')
+            lines.append('# TYPE ncdb_requests_total counter')
+            for (route, status), count in sorted(self._requests.items()):
+                lines.append(f'ncdb_requests_total{{{_labels(route=route, status=status)}}} {count}')
+            lines.append('# HELP ncdb_slow_queries_total Statements slower than the slow query threshold')
+            lines.append('# TYPE ncdb_slow_queries_total counter')
+            lines.append(f'ncdb_slow_queries_total {self._slow_queries}')
+        for render in self._sources:
+            lines.extend(render())
+        return '\n'.join(lines) + '\n'
@@ -1,58 +1,160 @@
 from flask_login import UserMixin
-from werkzeug.security import generate_password_hash, check_password_hash
-from app import db
+from app import db, password_hasher
 import json
-from sqlalchemy import inspect
+from datetime import datetime, timezone
+from types import MappingProxyType
+from sqlalchemy import event, inspect, update
 
-class User(UserMixin, db.Model):
+# changing any of these bumps User.version, which expires cached users
+AUTH_FIELDS = ('username', 'password_hash', 'accessible_tables', 'permissions', 'is_active')
+
+class UserPermissions:
+    """Permission checks shared by User and SessionUser, both providing get_acl()."""
+
+    def get_accessible_tables(self):
+        return list(self.get_acl().tables)
+
+    def get_permissions(self):
+        return {table: sorted(actions) for table, actions in self.get_acl().permissions.items()}
+
+    def can_access(self, table_name):
+        return table_name in self.get_acl().table_set
+
+    def can_view(self, table_name):
+        return self.get_acl().allows(table_name, 'view')
+
+    def can_edit(self, table_name):
+        return self.get_acl().allows(table_name, 'edit')
+
+    def can_view_core_table(self):
+        return self.get_acl().allows('core_table', 'view')
+
+    def can_edit_core_table(self):
+        return self.get_acl().allows('core_table', 'edit')
+
+class User(UserPermissions, UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(64), index=True, unique=True)
-    password_hash = db.Column(db.String(128))
+    # long enough for scrypt and pbkdf2:sha512 hashes with their parameters
+    password_hash = db.Column(db.String(256))
     accessible_tables = db.Column(db.Text, default='[]')
     permissions = db.Column(db.Text, default='{}')
     is_active = db.Column(db.Boolean, default=True)
+    version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
 
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = password_hasher.hash(password)
 
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        # may raise HasherBusy when too many logins are being checked at once
+        return password_hasher.verify(self.password_hash, password)
+
+    def rehash_password(self, password):
+        # on the hashing pool like check_password, and may raise HasherBusy the same way
+        self.password_hash = password_hasher.pooled_hash(password)
+
+    def password_needs_rehash(self):
+        return password_hasher.needs_rehash(self.password_hash)
 
     def get_id(self):
         return str(self.id)
 
-    def get_accessible_tables(self):
-        return json.loads(self.accessible_tables)
+    def get_acl(self):
+        # parsed once per user object; keyed on the raw columns so direct
+        # assignments to them are picked up as well
+        key = (self.accessible_tables, self.permissions)
+        cached = getattr(self, '_acl_cache', None)
+        if cached is None or cached[0] != key:
+            cached = (key, UserACL(*key))
+            self._acl_cache = cached
+        return cached[1]
+
+    def _invalidate_acl(self):
+        self._acl_cache = None
 
     def set_accessible_tables(self, tables):
         self.accessible_tables = json.dumps(tables)
-
-    def get_permissions(self):
-        return json.loads(self.permissions)
+        self._invalidate_acl()
 
     def set_permissions(self, permissions):
         self.permissions = json.dumps(permissions)
+        self._invalidate_acl()
 
-    def can_view(self, table_name):
-        permissions = self.get_permissions()
-        return table_name in permissions and 'view' in permissions[table_name]
+@event.listens_for(User, 'before_update')
+def _bump_user_version(mapper, connection, target):
+    state = inspect(target)
+    if any(state.attrs[key].history.has_changes() for key in AUTH_FIELDS):
+        target.version = (target.version or 0) + 1
 
-    def can_edit(self, table_name):
-        permissions = self.get_permissions()
-        return table_name in permissions and 'edit' in permissions[table_name]
+class SessionUser(UserPermissions, UserMixin):
+    """Read-only snapshot of a user for current_user, detached from any session."""
 
-    def can_view_core_table(self):
-        permissions = self.get_permissions()
-        return 'core_table' in permissions and 'view' in permissions['core_table']
+    FIELDS = ('id', 'username', 'version', 'is_active', 'accessible_tables', 'permissions')
+    is_active = True
 
-    def can_edit_core_table(self):
-        permissions = self.get_permissions()
-        return 'core_table' in permissions and 'edit' in permissions['core_table']
+    def __init__(self, id, username, version, is_active, accessible_tables, permissions):
+        self.id = id
+        self.username = username
+        self.version = version
+        self.is_active = bool(is_active)
+        self.accessible_tables = accessible_tables
+        self.permissions = permissions
+        self.acl = UserACL(accessible_tables, permissions)
+
+    @classmethod
+    def from_row(cls, row):
+        return cls(*(getattr(row, field) for field in cls.FIELDS))
+
+    @classmethod
+    def from_snapshot(cls, snapshot):
+        return cls(*(snapshot[field] for field in cls.FIELDS))
+
+    def to_snapshot(self):
+        return {field: getattr(self, field) for field in self.FIELDS}
+
+    def get_acl(self):
+        return self.acl
+
+class UserACL:
+    __slots__ = ('tables', 'table_set', 'permissions')
+
+    def __init__(self, accessible_tables, permissions):
+        self.tables = tuple(json.loads(accessible_tables or '[]'))
+        self.table_set = frozenset(self.tables)
+        self.permissions = MappingProxyType({
+            table: frozenset(actions) for table, actions in json.loads(permissions or '{}').items()
+        })
+
+    def allows(self, table_name, action):
+        return action in self.permissions.get(table_name, ())
+
+def utcnow():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
 
 class TableMetadata(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     table_name = db.Column(db.String(64), unique=True, nullable=False)
     description = db.Column(db.String(256))
+    version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    updated_at = db.Column(db.DateTime, default=utcnow)
+    # maintained by app.table_stats from the database's own statistics
+    row_estimate = db.Column(db.BigInteger)
+    size_bytes = db.Column(db.BigInteger)
+    stats_updated_at = db.Column(db.DateTime)
+    # None, 'ready' or 'stale'; see app.projections
+    core_projection = db.Column(db.String(16))
+
+    @classmethod
+    def bump_version(cls, *table_names):
+        # no names bumps every table, e.g. after shared core data changed
+        db.session.execute(cls.bump_version_statement(*table_names), execution_options={'synchronize_session': False})
+
+    @classmethod
+    def bump_version_statement(cls, *table_names):
+        stmt = update(cls).values(version=cls.version + 1, updated_at=utcnow())
+        if table_names:
+            stmt = stmt.where(cls.table_name.in_(table_names))
+        return stmt
 
 class CoreTable(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -65,8 +167,66 @@ class CoreTable(db.Model):
         return [column.key for column in cls.__table__.columns if column.key != 'id']
 
 class CoreTableAssociation(db.Model):
+    __table_args__ = (
+        db.Index('ix_core_table_association_table_name_table_id', 'table_name', 'table_id', unique=True),
+        db.Index('ix_core_table_association_core_id', 'core_id', 'table_name', 'table_id'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     table_name = db.Column(db.String(64), nullable=False)
     table_id = db.Column(db.Integer, nullable=False)
     core_id = db.Column(db.Integer, db.ForeignKey('core_table.id'), nullable=False)
     core = db.relationship('CoreTable', backref=db.backref('associations', lazy=True))
+
+class Job(db.Model):
+    __table_args__ = (
+        db.Index('ix_job_user_id_status', 'user_id', 'status'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    kind = db.Column(db.String(32), nullable=False)
+    table_name = db.Column(db.String(64))
+    status = db.Column(db.String(16), nullable=False, default='queued')
+    params = db.Column(db.Text, default='{}')
+    progress = db.Column(db.Integer, nullable=False, default=0)
+    total = db.Column(db.Integer)
+    result = db.Column(db.Text)
+    error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=utcnow)
+    started_at = db.Column(db.DateTime)
+    updated_at = db.Column(db.DateTime, default=utcnow)
+    finished_at = db.Column(db.DateTime)
+
+    def get_params(self):
+        return json.loads(self.params or '{}')
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'table_name': self.table_name,
+            'status': self.status,
+            'progress': self.progress,
+            'total': self.total,
+            'result': json.loads(self.result) if self.result else None,
+            'error': self.error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+        }
+
+class TableChange(db.Model):
+    # append-only feed of written row ids, read by app.changes
+    __table_args__ = (
+        db.Index('ix_table_change_table_name_id', 'table_name', 'id'),
+        db.Index('ix_table_change_changed_at', 'changed_at'),
+        {'sqlite_autoincrement': True},
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    table_name = db.Column(db.String(64), nullable=False)
+    # NULL for a 'reload' marker after a write too large to list row by row
+    row_id = db.Column(db.Integer)
+    op = db.Column(db.String(8), nullable=False)
+    changed_at = db.Column(db.DateTime, nullable=False, default=utcnow)
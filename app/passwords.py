@@ -0,0 +1,121 @@
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from werkzeug.security import check_password_hash, generate_password_hash
+
+
+class HasherBusy(Exception):
+    pass
+
+
+class PasswordHasher:
+    """Password hashing with a configurable method and cost, verified on a bounded pool.
+
+    Logins wait for one of `workers` hashing threads instead of hashing on
+    every request thread at once; past `queue_size` waiting logins, verify()
+    and pooled_hash() raise HasherBusy so a login burst cannot starve data
+    requests of CPU.
+    Hashes stored with other parameters than PASSWORD_HASH_METHOD are
+    reported by needs_rehash() and replaced at the next successful login.
+    """
+
+    def __init__(self, method='scrypt', salt_length=16, workers=None, queue_size=None, timeout=10):
+        self.method = method
+        self.salt_length = salt_length
+        self.workers = workers or max(1, (os.cpu_count() or 2) // 2)
+        self.queue_size = queue_size if queue_size is not None else self.workers * 8
+        self.timeout = timeout
+        self.verified = 0
+        self.rejected = 0
+        self.rehashed = 0
+        self._in_flight = 0
+        self._params = None
+        self._lock = threading.Lock()
+        self._slots = None
+        self._executor = None
+
+    def init_app(self, app):
+        self.method = app.config.get('PASSWORD_HASH_METHOD', self.method)
+        self.salt_length = app.config.get('PASSWORD_SALT_LENGTH', self.salt_length)
+        self.workers = app.config.get('PASSWORD_HASH_WORKERS') or self.workers
+        queue_size = app.config.get('PASSWORD_HASH_QUEUE')
+        self.queue_size = queue_size if queue_size is not None else self.workers * 8
+        self.timeout = app.config.get('PASSWORD_HASH_TIMEOUT', self.timeout)
+        self._params = None
+        app.extensions['password_hasher'] = self
+
+    def hash(self, password):
+        return generate_password_hash(password, self.method, self.salt_length)
+
+    @property
+    def params(self):
+        # werkzeug fills in defaults, e.g. 'scrypt' is stored as 'scrypt:32768:8:1'
+        if self._params is None:
+            self._params = generate_password_hash('', self.method, 1).split('$', 1)[0]
+        return self._params
+
+    def needs_rehash(self, password_hash):
+        return not password_hash or password_hash.split('$', 1)[0] != self.params
+
+    def _get_executor(self):
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._slots = threading.BoundedSemaphore(self.workers + self.queue_size)
+                    self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='hash')
+        return self._executor
+
+    def _release(self, future):
+        with self._lock:
+            self._in_flight -= 1
+        self._slots.release()
+
+    def _submit(self, fn, *args):
+        executor = self._get_executor()
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            logging.warning("Password hashing queue is full, rejecting login")
+            raise HasherBusy('Too many logins in progress')
+        with self._lock:
+            self._in_flight += 1
+        future = executor.submit(fn, *args)
+        # the slot is held until the hash is done, even if this request gave up waiting
+        future.add_done_callback(self._release)
+        return future
+
+    def _result(self, future):
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            raise HasherBusy('Password hashing timed out')
+
+    def verify(self, password_hash, password):
+        if not password_hash:
+            return False
+        future = self._submit(check_password_hash, password_hash, password)
+        with self._lock:
+            self.verified += 1
+        return self._result(future)
+
+    def pooled_hash(self, password):
+        """hash() on the hashing pool, for request threads; may raise HasherBusy."""
+        return self._result(self._submit(self.hash, password))
+
+    def record_rehash(self):
+        with self._lock:
+            self.rehashed += 1
+
+    def metrics_lines(self):
+        with self._lock:
+            return [
+                '# TYPE ncdb_password_checks_total counter',
+                f'ncdb_password_checks_total {self.verified}',
+                '# TYPE ncdb_password_checks_rejected_total counter',
+                f'ncdb_password_checks_rejected_total {self.rejected}',
+                '# TYPE ncdb_password_rehashes_total counter',
+                f'ncdb_password_rehashes_total {self.rehashed}',
+                '# TYPE ncdb_password_checks_in_flight gauge',
+                f'ncdb_password_checks_in_flight {self._in_flight}',
+            ]
@@ -0,0 +1,221 @@
+import logging
+import threading
+from sqlalchemy import Column, Index, MetaData, Table, and_, column, delete, insert, select, table as table_clause
+
+READY = 'ready'
+STALE = 'stale'
+
+
+class CoreProjection:
+    """Optional per-table shadow copy of a user table with its core fields joined in.
+
+    `<table>__core` holds every user column plus `core__id` and one
+    `core__<field>` column per CoreTable field, so a page with core data is
+    a single-table scan. TableMetadata.core_projection says whether it can
+    be read: 'ready' tables are refreshed row by row in the same transaction
+    as each write; writes that replace whole tables (imports, seeding) mark
+    it 'stale' and reads use the join until it is rebuilt.
+    """
+
+    SUFFIX = '__core'
+    CORE_PREFIX = 'core__'
+
+    def __init__(self, db, schema_registry):
+        self.db = db
+        self.schema_registry = schema_registry
+        self.builds = 0
+        self.refreshes = 0
+        self.reads = 0
+        self.fallbacks = 0
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        from app.models import CoreTable, CoreTableAssociation, TableMetadata  # app.models imports app
+        self.core = CoreTable.__table__
+        self.assoc = CoreTableAssociation.__table__
+        self.core_fields = CoreTable.get_fields()
+        self.metadata_model = TableMetadata
+        app.extensions['core_projection'] = self
+
+    def name_for(self, table_name):
+        return f"{table_name}{self.SUFFIX}"
+
+    def core_columns(self):
+        return [f"{self.CORE_PREFIX}id"] + [f"{self.CORE_PREFIX}{field}" for field in self.core_fields]
+
+    def _count(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    # statements, shared with the async API
+
+    def status_statement(self, table_name):
+        Meta = self.metadata_model
+        return select(Meta.core_projection).where(Meta.table_name == table_name)
+
+    def ready_tables_statement(self):
+        Meta = self.metadata_model
+        return select(Meta.table_name).where(Meta.core_projection == READY)
+
+    def _source(self, table, table_name):
+        """User columns, core id and core fields of `table`, outer joined."""
+        core, assoc = self.core, self.assoc
+        return select(
+            *table.columns,
+            core.c.id.label(f"{self.CORE_PREFIX}id"),
+            *[core.c[field].label(f"{self.CORE_PREFIX}{field}") for field in self.core_fields]
+        ).select_from(
+            table.outerjoin(assoc, and_(assoc.c.table_name == table_name, assoc.c.table_id == table.c.id))
+            .outerjoin(core, core.c.id == assoc.c.core_id)
+        )
+
+    def refresh_statements(self, table, table_name, row_ids):
+        """DELETE and INSERT ... SELECT re-projecting `row_ids` (a list or a subquery)."""
+        names = [c.name for c in table.columns] + self.core_columns()
+        projection = table_clause(self.name_for(table_name), *[column(name) for name in names])
+        return [
+            delete(projection).where(projection.c.id.in_(row_ids)),
+            insert(projection).from_select(names, self._source(table, table_name).where(table.c.id.in_(row_ids))),
+        ]
+
+    def core_row_ids(self, table_name, core_ids):
+        assoc = self.assoc
+        return select(assoc.c.table_id).where(assoc.c.table_name == table_name, assoc.c.core_id.in_(core_ids))
+
+    def reload_statement(self, table_name):
+        Meta = self.metadata_model
+        return Meta.__table__.update().where(
+            Meta.table_name == table_name, Meta.core_projection == READY
+        ).values(core_projection=STALE)
+
+    # maintenance on the current session; the caller commits
+
+    def refresh(self, table_name, row_ids):
+        """Re-project rows of `table_name` after they were written, if it has a ready projection."""
+        row_ids = list(row_ids)
+        if not row_ids:
+            return
+        session = self.db.session
+        if session.execute(self.status_statement(table_name)).scalar() != READY:
+            return
+        session.flush()
+        table = self.schema_registry.get_table(table_name)
+        for statement in self.refresh_statements(table, table_name, row_ids):
+            session.execute(statement)
+        self._count('refreshes')
+
+    def refresh_core(self, core_ids):
+        """Re-project the rows associated with changed CoreTable rows, in every ready projection."""
+        core_ids = list(core_ids)
+        if not core_ids:
+            return
+        session = self.db.session
+        session.flush()
+        for table_name in session.scalars(self.ready_tables_statement()).all():
+            table = self.schema_registry.get_table(table_name)
+            for statement in self.refresh_statements(table, table_name, self.core_row_ids(table_name, core_ids)):
+                session.execute(statement)
+            self._count('refreshes')
+
+    def reload(self, table_name):
+        """Mark a ready projection stale after a write that did not track row ids."""
+        self.db.session.execute(self.reload_statement(table_name))
+
+    def sync(self, table_name):
+        """Rebuild the projection if a reload left it stale."""
+        if self.db.session.execute(self.status_statement(table_name)).scalar() == STALE:
+            self.build(table_name)
+
+    def _shadow_table(self, table, table_name):
+        name = self.name_for(table_name)
+        metadata = MetaData()
+        columns = [Column(c.name, c.type, primary_key=c.primary_key, autoincrement=False) for c in table.columns]
+        columns.append(Column(f"{self.CORE_PREFIX}id", self.core.c.id.type, index=True))
+        columns += [Column(f"{self.CORE_PREFIX}{field}", self.core.c[field].type) for field in self.core_fields]
+        shadow = Table(name, metadata, *columns)
+        # the same sort and filter indexes as the user table
+        for index in table.indexes:
+            Index(f"{index.name}{self.SUFFIX}", *[shadow.c[c.name] for c in index.columns])
+        return shadow
+
+    def build(self, table_name):
+        """(Re)create and fill the projection of `table_name` and mark it ready."""
+        session = self.db.session
+        connection = session.connection()
+        table = self.schema_registry.get_table(table_name)
+        name = self.name_for(table_name)
+        shadow = self._shadow_table(table, table_name)
+        self.schema_registry.invalidate(name)
+        existing = self.schema_registry.get_table(name) if self.schema_registry.has_table(name) else None
+        if existing is not None and [c.name for c in existing.columns] == [c.name for c in shadow.columns]:
+            if connection.dialect.name == 'postgresql':
+                # row refreshes from concurrent writes wait and are applied on top of the rebuild
+                connection.exec_driver_sql(f'LOCK TABLE "{name}" IN SHARE ROW EXCLUSIVE MODE')
+            session.execute(shadow.delete())
+        else:
+            if existing is not None:
+                existing.drop(connection)
+            shadow.create(connection)
+        session.execute(insert(shadow).from_select([c.name for c in shadow.columns], self._source(table, table_name)))
+        Meta = self.metadata_model
+        session.execute(Meta.__table__.update().where(Meta.table_name == table_name).values(core_projection=READY))
+        Meta.bump_version(table_name)
+        self.schema_registry.invalidate(name)
+        self._count('builds')
+        logging.info(f"Built core projection for {table_name}")
+
+    def drop(self, table_name):
+        session = self.db.session
+        name = self.name_for(table_name)
+        Meta = self.metadata_model
+        session.execute(Meta.__table__.update().where(Meta.table_name == table_name).values(core_projection=None))
+        self.schema_registry.invalidate(name)
+        if self.schema_registry.has_table(name):
+            Table(name, MetaData()).drop(session.connection())
+            self.schema_registry.invalidate(name)
+        Meta.bump_version(table_name)
+        logging.info(f"Dropped core projection for {table_name}")
+
+    # reads
+
+    def table_for(self, table, table_name, status):
+        """The reflected projection if it is ready and still has every user column, else None."""
+        name = self.name_for(table_name)
+        if status != READY or not self.schema_registry.has_table(name):
+            if status == READY:
+                self._count('fallbacks')
+            return None
+        projection = self.schema_registry.get_table(name)
+        if any(c.name not in projection.c for c in table.columns):
+            # the user table gained columns since the last build
+            self._count('fallbacks')
+            return None
+        self._count('reads')
+        return projection
+
+    def select(self, projection, columns):
+        return select(*[projection.c[name] for name in columns], *[projection.c[name] for name in self.core_columns()])
+
+    def split_rows(self, rows, columns):
+        """(user rows, {id: core values}) from rows of select(); rows without core data are left out."""
+        width = len(columns)
+        id_index = columns.index('id')
+        core_by_id = {row[id_index]: tuple(row[width + 1:]) for row in rows if row[width] is not None}
+        return [row[:width] for row in rows], core_by_id
+
+    def stats(self):
+        with self._lock:
+            return {'builds': self.builds, 'refreshes': self.refreshes, 'reads': self.reads, 'fallbacks': self.fallbacks}
+
+    def metrics_lines(self):
+        stats = self.stats()
+        return [
+            '# TYPE ncdb_core_projection_builds_total counter',
+            f"ncdb_core_projection_builds_total {stats['builds']}",
+            '# TYPE ncdb_core_projection_refreshes_total counter',
+            f"ncdb_core_projection_refreshes_total {stats['refreshes']}",
+            '# TYPE ncdb_core_projection_reads_total counter',
+            f"ncdb_core_projection_reads_total {stats['reads']}",
+            '# TYPE ncdb_core_projection_fallbacks_total counter',
+            f"ncdb_core_projection_fallbacks_total {stats['fallbacks']}",
+        ]
@@ -0,0 +1,171 @@
+import base64
+import json
+from datetime import date, datetime
+from sqlalchemy import and_, false, func, or_, select, String
+from app.schema import python_type
+
+
+class QueryError(ValueError):
+    pass
+
+
+FILTER_OPS = {
+    'eq': lambda column, value: column == value,
+    'ne': lambda column, value: column != value,
+    'lt': lambda column, value: column < value,
+    'lte': lambda column, value: column <= value,
+    'gt': lambda column, value: column > value,
+    'gte': lambda column, value: column >= value,
+    'contains': lambda column, value: column.icontains(str(value), autoescape=True),
+    'startswith': lambda column, value: column.istartswith(str(value), autoescape=True),
+}
+
+
+def _coerce(column, value):
+    if value is None:
+        return None
+    value_type = python_type(column)
+    try:
+        if value_type is bool and isinstance(value, str):
+            return value.lower() in ('1', 'true', 'yes')
+        if value_type in (int, float) and isinstance(value, str):
+            return value_type(value)
+        if value_type in (date, datetime) and isinstance(value, str):
+            return value_type.fromisoformat(value)
+    except ValueError:
+        raise QueryError(f"Invalid value for column {column.name}: {value}")
+    return value
+
+
+class TableQuery:
+    """Filters, search, sort and keyset cursor for a reflected user table.
+
+    Query parameters:
+      filter=<column>:<op>:<value>  (repeatable; ops are in FILTER_OPS plus isnull)
+      q=<text>                      case-insensitive search over string columns
+      sort=<column>,-<column>       multi-column sort, '-' for descending
+      after=<cursor>                next_cursor from the previous page
+      offset=<n>                    start of a row window, for random access (not with after)
+    """
+
+    def __init__(self, table, args, columns=None):
+        self.table = table
+        # the names usable in filter, sort and search, default all of the table's
+        self.columns = {name: table.c[name] for name in (columns if columns is not None else table.c.keys())}
+        self.filters = [self._parse_filter(spec) for spec in args.getlist('filter')]
+        self.search = args.get('q', '').strip()
+        self.keys = self._parse_sort(args.get('sort', ''))
+        self.cursor = self._decode_cursor(args.get('after'))
+        self.offset = self._parse_offset(args.get('offset'))
+
+    def _column(self, name):
+        if name not in self.columns:
+            raise QueryError(f"Unknown column: {name}")
+        return self.columns[name]
+
+    def _parse_filter(self, spec):
+        parts = spec.split(':', 2)
+        if len(parts) < 2:
+            raise QueryError(f"Invalid filter: {spec}")
+        column = self._column(parts[0])
+        op = parts[1]
+        value = parts[2] if len(parts) == 3 else ''
+        if op == 'isnull':
+            return column.is_(None) if value.lower() in ('', '1', 'true', 'yes') else column.is_not(None)
+        if op not in FILTER_OPS:
+            raise QueryError(f"Unknown filter operator: {op}")
+        return FILTER_OPS[op](column, _coerce(column, value))
+
+    def _parse_sort(self, spec):
+        keys = []
+        for name in filter(None, (part.strip() for part in spec.split(','))):
+            descending = name.startswith('-')
+            column = self._column(name.lstrip('-'))
+            keys.append((column, descending))
+            if column.name == 'id':
+                # id is unique, later keys can never break a tie
+                return keys
+        keys.append((self.table.c.id, False))
+        return keys
+
+    def _parse_offset(self, offset):
+        if offset is None or offset == '':
+            return None
+        try:
+            offset = int(offset)
+        except ValueError:
+            raise QueryError(f"Invalid offset: {offset}")
+        if offset < 0:
+            raise QueryError(f"Invalid offset: {offset}")
+        if self.cursor is not None:
+            raise QueryError("Use either after or offset, not both")
+        return offset
+
+    @property
+    def is_first_page(self):
+        return self.cursor is None and not self.offset
+
+    @property
+    def is_default_order(self):
+        return len(self.keys) == 1 and not self.keys[0][1] and self.keys[0][0].name == 'id'
+
+    @property
+    def is_filtered(self):
+        return bool(self.filters or self.search)
+
+    def _decode_cursor(self, after):
+        if not after:
+            return None
+        try:
+            if self.is_default_order:
+                return [int(after)]
+            values = json.loads(base64.urlsafe_b64decode(after.encode()))
+        except (ValueError, TypeError):
+            raise QueryError('Invalid cursor')
+        if not isinstance(values, list) or len(values) != len(self.keys):
+            raise QueryError('Invalid cursor')
+        return [_coerce(column, value) for (column, _), value in zip(self.keys, values)]
+
+    def encode_cursor(self, row_values):
+        values = [row_values[column.name] for column, _ in self.keys]
+        if self.is_default_order:
+            return values[0]
+        return base64.urlsafe_b64encode(json.dumps(values, default=str).encode()).decode()
+
+    def _filter_clauses(self):
+        clauses = list(self.filters)
+        if self.search:
+            searchable = [column for column in self.columns.values() if isinstance(column.type, String)]
+            if searchable:
+                clauses.append(or_(*[column.icontains(self.search, autoescape=True) for column in searchable]))
+            else:
+                clauses.append(false())
+        return clauses
+
+    def where_clauses(self):
+        clauses = self._filter_clauses()
+        if self.cursor is not None:
+            clauses.append(self._after_clause())
+        return clauses
+
+    def _after_clause(self):
+        if self.is_default_order:
+            return self.table.c.id > self.cursor[0]
+        # keyset predicate for ORDER BY ... NULLS LAST: rows sorting strictly after the cursor
+        branches = []
+        for i, ((column, descending), value) in enumerate(zip(self.keys, self.cursor)):
+            if value is None:
+                continue
+            ties = [prev_column.is_(None) if prev is None else prev_column == prev
+                    for (prev_column, _), prev in zip(self.keys[:i], self.cursor[:i])]
+            beyond = column < value if descending else column > value
+            branches.append(and_(*ties, or_(beyond, column.is_(None))))
+        return or_(*branches) if branches else false()
+
+    def order_by(self):
+        if self.is_default_order:
+            return [self.table.c.id]
+        return [(column.desc() if descending else column.asc()).nulls_last() for column, descending in self.keys]
+
+    def count_statement(self):
+        return select(func.count()).select_from(self.table).where(*self._filter_clauses())
@@ -0,0 +1,69 @@
+import itertools
+import time
+from functools import wraps
+from flask import current_app, g, has_request_context, session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import create_engine, event
+from app.engine import configure_engine, engine_options
+
+
+class RoutingSession(Session):
+    """Session that sends reads to a replica inside @read_replica views."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and has_request_context() and g.get('use_replica'):
+            router = current_app.extensions.get('replicas')
+            if router is not None and router.engines:
+                # one replica per request, so a page and its count share the same replication lag
+                if g.get('replica_engine') is None:
+                    g.replica_engine = router.next_engine()
+                return g.replica_engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+class ReplicaRouter:
+    def __init__(self, app=None):
+        self.engines = []
+        self._cycle = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.engines = []
+        for i, uri in enumerate(app.config.get('SQLALCHEMY_REPLICA_URIS') or []):
+            engine = create_engine(uri, **engine_options(app.config, uri))
+            configure_engine(engine, app.config, label=f'replica{i}')
+            self.engines.append(engine)
+        self._cycle = itertools.cycle(self.engines) if self.engines else None
+        app.extensions['replicas'] = self
+
+    def next_engine(self):
+        return next(self._cycle)
+
+
+def _recently_wrote():
+    window = current_app.config.get('REPLICA_READ_AFTER_WRITE_SECONDS', 0)
+    last_write = session.get('last_write_at')
+    return last_write is not None and time.time() - last_write < window
+
+
+def read_replica(view):
+    """Route the view's queries to a replica unless this user wrote recently."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        g.use_replica = not _recently_wrote()
+        try:
+            return view(*args, **kwargs)
+        finally:
+            g.use_replica = False
+    return wrapper
+
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _remember_write(db_session):
+    # keeps the writer's own reads on the primary until replicas have caught up
+    if not has_request_context() or g.get('use_replica'):
+        return
+    router = current_app.extensions.get('replicas')
+    if router is not None and router.engines:
+        session['last_write_at'] = time.time()
@@ -1,16 +1,67 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify
+from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify, current_app, Response, send_file, stream_with_context, session
 from flask_login import login_user, login_required, logout_user, current_user
-from app import db
-from app.models import User, TableMetadata, CoreTable, CoreTableAssociation
-from sqlalchemy import inspect, Table, text
+from app import db, schema_registry, metrics, job_queue, change_feed, statement_cache, password_hasher, user_cache, core_projection
+from app.models import User, TableMetadata, CoreTable, CoreTableAssociation, Job
+from app.export import EXPORT_FORMATS
+from app.bulk import RowError, load_rows, parse_rows
+from app.importer import IMPORT_MIMETYPES, UploadError, check_format, import_file
+from app.serialization import BINARY_FORMATS, FormatError, arrow_batch, arrow_schema, check_binary_format, dumps, iter_arrow_stream, json_response, pack
+from app.query import QueryError, TableQuery
+from app.replicas import read_replica
+from app.table_data import core_data_by_id, core_data_statement, table_payload
+from app.table_stats import COUNT_MODES, default_count_mode, estimated_total
+from app.jobs import JobLimitError
+from app.passwords import HasherBusy
+from app.statements import UnknownColumnError
+from app.sample_data import seed_sample_tables
+from datetime import datetime, timezone
+import hashlib
+import hmac
 import json
 import logging
+import time
 import traceback
 import sqlalchemy
 
 
 bp = Blueprint('main', __name__)
 
+def _page_limit():
+    limit = request.args.get('limit', current_app.config['TABLE_PAGE_SIZE'], type=int)
+    return max(1, min(limit, current_app.config['TABLE_MAX_PAGE_SIZE']))
+
+def _table_etag(table_name, view_mode, meta):
+    key = f"{table_name}:{meta.version}:{meta.updated_at}:{view_mode}:{current_user.can_view_core_table()}:{request.query_string.decode()}"
+    return hashlib.sha1(key.encode()).hexdigest()
+
+def _not_modified(etag, last_modified):
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(etag)
+    if request.if_modified_since and last_modified:
+        return last_modified.replace(microsecond=0) <= request.if_modified_since.replace(tzinfo=None)
+    return False
+
+def _cache_headers(response, etag, last_modified):
+    if etag is not None:
+        response.set_etag(etag, weak=True)
+        response.last_modified = last_modified
+        response.cache_control.private = True
+        response.cache_control.no_cache = True
+    return response
+
+def _background_requested():
+    return request.args.get('background', '').lower() in ('1', 'true', 'yes')
+
+def _enqueue(kind, table_name=None, params=None, upload=None):
+    try:
+        job = job_queue.submit(current_user, kind, table_name, params, upload)
+    except JobLimitError as e:
+        return jsonify({'error': str(e)}), 429
+    response = jsonify({'job': job.to_dict()})
+    response.status_code = 202
+    response.headers['Location'] = url_for('main.get_job', job_id=job.id)
+    return response
+
 @bp.route('/')
 def index():
     return render_template('index.html')
@@ -27,8 +78,25 @@ def login():
         user = User.query.filter_by(username=username).first()
         if user:
             logging.info(f"User found: {user.username}")
-            if user.check_password(password):
+            try:
+                password_ok = user.check_password(password)
+            except HasherBusy:
+                flash('Too many sign-ins right now, please try again in a moment')
+                response = current_app.make_response((render_template('login.html'), 503))
+                response.headers['Retry-After'] = '1'
+                return response
+            if password_ok:
                 logging.info("Password check successful")
+                if user.password_needs_rehash():
+                    # stored with an older hash method or cost
+                    try:
+                        user.rehash_password(password)
+                        db.session.commit()
+                        password_hasher.record_rehash()
+                        logging.info(f"Rehashed password for {user.username}")
+                    except HasherBusy:
+                        # the old hash still works, the next login tries again
+                        logging.warning(f"Password rehash for {user.username} skipped, hashing pool busy")
                 login_user(user)
                 return redirect(url_for('main.dashboard'))
             else:
@@ -43,10 +111,12 @@ def login():
 @login_required
 def logout():
     logout_user()
+    session.pop(user_cache.SESSION_KEY, None)
     return redirect(url_for('main.index'))
 
 @bp.route('/check_user_tables')
 @login_required
+@read_replica
 def check_user_tables():
     return jsonify({
         'username': current_user.username,
@@ -61,66 +131,112 @@ def raw_employees():
 
 @bp.route('/dashboard')
 @login_required
+@read_replica
 def dashboard():
     accessible_tables = current_user.get_accessible_tables()
     table_metadata = TableMetadata.query.filter(TableMetadata.table_name.in_(accessible_tables)).all()
     user_tables = {meta.table_name: meta.description for meta in table_metadata}
-    return render_template('dashboard.html', tables=user_tables)
+    table_stats = {meta.table_name: meta for meta in table_metadata}
+    return render_template('dashboard.html', tables=user_tables, table_stats=table_stats,
+                           change_stream=bool(change_feed.stream_seconds))
+
+def _binary_page(response_format, table, data):
+    """A columnar page as MessagePack, or as an Arrow IPC stream with the paging fields in its schema metadata."""
+    mimetype = BINARY_FORMATS[response_format][0]
+    if response_format == 'msgpack':
+        return current_app.response_class(pack(data), mimetype=mimetype)
+    core = CoreTable.__table__
+    columns = list(table.columns) + [core.c[field] for field in data['core_columns']]
+    names = data['columns'] + [f"core_{field}" for field in data['core_columns']]
+    paging = {key: data[key] for key in ('next_cursor', 'total', 'total_estimated', 'offset')}
+    schema = arrow_schema(columns, names, {'ncdb': dumps(paging)})
+    body = b''.join(iter_arrow_stream(schema, [arrow_batch(schema, data['rows'])]))
+    return current_app.response_class(body, mimetype=mimetype)
 
 @bp.route('/get_table_data/<table_name>/<view_mode>')
 @login_required
+@read_replica
 def get_table_data(table_name, view_mode):
     logging.info(f"Attempting to fetch data for table: {table_name} in {view_mode} mode")
     logging.info(f"User {current_user.username} accessible tables: {current_user.get_accessible_tables()}")
 
-    if table_name not in current_user.get_accessible_tables():
+    if not current_user.can_access(table_name):
         logging.warning(f"Access denied for user {current_user.username} to table {table_name}")
         return jsonify({'error': 'Access denied'}), 403
 
     try:
-        inspector = inspect(db.engine)
-        if table_name not in inspector.get_table_names():
+        # answer conditional GETs from table_metadata alone
+        meta = db.session.execute(
+            db.select(TableMetadata.version, TableMetadata.updated_at, TableMetadata.row_estimate,
+                      TableMetadata.core_projection).filter_by(table_name=table_name)
+        ).first()
+        etag = last_modified = None
+        if meta is not None:
+            etag = _table_etag(table_name, view_mode, meta)
+            last_modified = meta.updated_at
+            if _not_modified(etag, last_modified):
+                return _cache_headers(current_app.response_class(status=304), etag, last_modified)
+
+        if not schema_registry.has_table(table_name):
             logging.error(f"Table not found in database: {table_name}")
             return jsonify({'error': 'Table not found'}), 404
 
-        table = Table(table_name, db.metadata, autoload_with=db.engine)
+        table = schema_registry.get_table(table_name)
         columns = [column.name for column in table.columns]
 
         if view_mode == 'spreadsheet' or view_mode == 'list':
-            if current_user.can_view_core_table():
-                result = db.session.query(table, CoreTable).outerjoin(
-                    CoreTableAssociation,
-                    (CoreTableAssociation.table_name == table_name) &
-                    (CoreTableAssociation.table_id == table.c.id)
-                ).outerjoin(CoreTable).all()
-
-                data = []
-                for row in result:
-                    row_dict = dict(zip(columns, row)) if isinstance(row, tuple) else row._asdict()
-                    core_data = {}
-                    if len(row) > 1 and row[-1] is not None and isinstance(row[-1], CoreTable):
-                        core_data = {field: getattr(row[1], field, None) for field in CoreTable.get_fields()}
-                    elif len(row) > 1 and row[-1] is not None:
-                        # If row[1] is not a CoreTable object, try to parse it as JSON
-                        try:
-                            core_data = json.loads(row[-1])
-                        except json.JSONDecodeError:
-                            logging.warning(f"Could not parse core data for row {row_dict.get('id')}")
-                    data.append({
-                        'id': row_dict.get('id'),
-                        'user_data': json.dumps({k: str(v) for k, v in row_dict.items() if k != 'id'}),
-                        'core_data': json.dumps(core_data)
-                    })
+            if request.args.get('format') in BINARY_FORMATS:
+                check_binary_format(request.args['format'])
+            limit = _page_limit()
+            projection = None
+            if current_user.can_view_core_table() and meta is not None:
+                projection = core_projection.table_for(table, table_name, meta.core_projection)
+            # filters, search, sort and the keyset cursor all compile to SQL
+            if projection is not None:
+                # user and core columns in one scan of the shadow table
+                table_query = TableQuery(projection, request.args, columns)
+                stmt = core_projection.select(projection, columns)
             else:
-                result = db.session.execute(table.select()).fetchall()
-                data = []
-                for row in result:
-                    row_dict = dict(zip(columns, row)) if isinstance(row, tuple) else row._asdict()
-                    data.append({
-                        'id': row_dict.get('id'),
-                        'user_data': json.dumps({k: str(v) for k, v in row_dict.items() if k != 'id'}),
-                        'core_data': '{}'
-                    })
+                table_query = TableQuery(table, request.args)
+                stmt = table.select()
+            row_estimate = meta.row_estimate if meta is not None else None
+            count_mode = request.args.get('count', default_count_mode(table_query, row_estimate))
+            if count_mode not in COUNT_MODES:
+                raise QueryError(f"Invalid count mode: {count_mode}")
+            stmt = stmt.where(*table_query.where_clauses()).order_by(*table_query.order_by())
+            result = db.session.execute(stmt.limit(limit + 1).offset(table_query.offset)).fetchall()
+
+            next_cursor = None
+            if len(result) > limit:
+                result = result[:limit]
+                next_cursor = table_query.encode_cursor(dict(zip(columns, result[-1])))
+
+            metrics.record_rows(len(result))
+
+            # core fields for the whole page in one IN query, merged without ORM objects
+            core_by_id = None
+            if projection is not None:
+                result, core_by_id = core_projection.split_rows(result, columns)
+            elif current_user.can_view_core_table():
+                page_ids = [row[columns.index('id')] for row in result]
+                core_by_id = core_data_by_id(db.session.execute(core_data_statement(table_name, page_ids))) if page_ids else {}
+
+            # table_metadata's background estimate stands in for COUNT(*) on large unfiltered tables
+            total = None
+            if count_mode == 'estimate' and meta is not None:
+                total = estimated_total(table_query, row_estimate, current_app.config['TABLE_STATS_EXACT_BELOW'])
+            total_estimated = total is not None
+            if count_mode != 'none' and total is None:
+                total = db.session.execute(table_query.count_statement()).scalar()
+
+            response_format = request.args.get('format')
+            columnar = response_format == 'columnar' or response_format in BINARY_FORMATS
+            data = table_payload(columns, result, core_by_id, columnar, next_cursor, total, total_estimated, table_query.offset)
+            if response_format in BINARY_FORMATS:
+                return _cache_headers(_binary_page(response_format, table, data), etag, last_modified)
+            if columnar:
+                logging.info(f"Returning columnar data for {table_name} in {view_mode} mode")
+                return _cache_headers(json_response(data), etag, last_modified)
         elif view_mode == 'form':
             data = {
                 'user_fields': [col for col in columns if col != 'id'],
@@ -131,52 +247,211 @@ def get_table_data(table_name, view_mode):
             return jsonify({'error': 'Invalid view mode'}), 400
 
         logging.info(f"Returning data for {table_name} in {view_mode} mode")
-        return jsonify(data)
+        return _cache_headers(jsonify(data), etag, last_modified)
+    except (QueryError, FormatError) as e:
+        logging.warning(f"Invalid query for {table_name}: {str(e)}")
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         logging.error(f"Error fetching data for {table_name}: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
-@bp.route('/seed_sample_data')
-def seed_sample_data():
+def _change_cursor():
+    # EventSource sends the last event id back when it reconnects
+    since = request.headers.get('Last-Event-ID') or request.args.get('since')
+    if since is not None:
+        try:
+            since = int(since)
+        except ValueError:
+            raise QueryError(f"Invalid change cursor: {since}")
+        if since < 0:
+            raise QueryError(f"Invalid change cursor: {since}")
+        return since
+    since_time = request.args.get('since_time')
+    if since_time is not None:
+        try:
+            since_time = datetime.fromisoformat(since_time)
+        except ValueError:
+            raise QueryError(f"Invalid timestamp: {since_time}")
+        if since_time.tzinfo is not None:
+            since_time = since_time.astimezone(timezone.utc).replace(tzinfo=None)
+        return change_feed.cursor_at(db.session, since_time)
+    return None
+
+def _changed_rows(table, table_name, feed, include_core):
+    """The current state of the rows in a change_feed result, in columnar form."""
+    payload = {'cursor': feed['cursor'], 'reload': feed['reload']}
+    if feed['reload']:
+        return payload
+    row_ids = list(dict.fromkeys(row_id for _, row_id, _ in feed['changes']))
+    columns = [column.name for column in table.columns]
+    rows = db.session.execute(table.select().where(table.c.id.in_(row_ids))).fetchall() if row_ids else []
+    core_by_id = None
+    if include_core:
+        core_by_id = core_data_by_id(db.session.execute(core_data_statement(table_name, row_ids))) if row_ids else {}
+    data = table_payload(columns, rows, core_by_id, columnar=True)
+    found = {row[columns.index('id')] for row in rows}
+    payload.update(
+        columns=data['columns'],
+        core_columns=data['core_columns'],
+        rows=data['rows'],
+        inserted=list(dict.fromkeys(row_id for _, row_id, op in feed['changes'] if op == 'insert' and row_id in found)),
+        deleted=[row_id for row_id in row_ids if row_id not in found]
+    )
+    return payload
+
+@bp.route('/table_changes/<table_name>')
+@login_required
+@read_replica
+def get_table_changes(table_name):
+    """Rows written since `since` (a cursor from an earlier response) or `since_time`.
+
+    Without either only the current cursor is returned.
+    """
+    if not current_user.can_access(table_name):
+        return jsonify({'error': 'Access denied'}), 403
+    if not schema_registry.has_table(table_name):
+        return jsonify({'error': 'Table not found'}), 404
+    try:
+        feed = change_feed.changes_since(db.session, table_name, _change_cursor())
+        table = schema_registry.get_table(table_name)
+        return json_response(_changed_rows(table, table_name, feed, current_user.can_view_core_table()))
+    except QueryError as e:
+        return jsonify({'error': str(e)}), 400
+
+@bp.route('/table_changes/<table_name>/stream')
+@login_required
+def stream_table_changes(table_name):
+    """Server-sent events with the same payload as /table_changes, one per batch of changes.
+
+    Off unless CHANGE_STREAM_SECONDS is set. A stream holds its worker
+    thread for up to CHANGE_STREAM_SECONDS, then ends and EventSource
+    reconnects from the last event id.
+    """
+    if not current_user.can_access(table_name):
+        return jsonify({'error': 'Access denied'}), 403
+    if not change_feed.stream_seconds:
+        return jsonify({'error': 'Change streaming is disabled'}), 404
+    if not schema_registry.has_table(table_name):
+        return jsonify({'error': 'Table not found'}), 404
+    try:
+        since = _change_cursor()
+    except QueryError as e:
+        return jsonify({'error': str(e)}), 400
+    if since is None:
+        since = change_feed.changes_since(db.session, table_name, None)['cursor']
+    table = schema_registry.get_table(table_name)
+    include_core = current_user.can_view_core_table()
+    db.session.close()
+
+    def events():
+        cursor = since
+        sent = set()
+        deadline = time.monotonic() + change_feed.stream_seconds
+        last_event = time.monotonic()
+        yield 'retry: 2000\n\n'
+        while time.monotonic() < deadline:
+            feed = change_feed.changes_since(db.session, table_name, cursor)
+            # unsettled changes come back on every poll until the cursor passes them
+            fresh = [change for change in feed['changes'] if change[0] not in sent]
+            if feed['reload'] or fresh:
+                payload = _changed_rows(table, table_name, dict(feed, changes=fresh), include_core)
+                yield f"id: {feed['cursor']}\nevent: changes\ndata: {dumps(payload).decode()}\n\n"
+                last_event = time.monotonic()
+            elif time.monotonic() - last_event >= 15:
+                yield ': keepalive\n\n'
+                last_event = time.monotonic()
+            cursor = feed['cursor']
+            sent = {change_id for change_id in sent | {change[0] for change in fresh} if change_id > cursor}
+            # give the connection back to the pool between polls
+            db.session.close()
+            time.sleep(change_feed.poll_seconds)
+
+    response = Response(stream_with_context(events()), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@bp.route('/export_table_data/<table_name>')
+@login_required
+def export_table_data(table_name):
+    if not current_user.can_access(table_name):
+        logging.warning(f"Access denied for user {current_user.username} to table {table_name}")
+        return jsonify({'error': 'Access denied'}), 403
+
+    export_format = request.args.get('format', 'ndjson')
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({'error': 'Invalid export format'}), 400
+    if export_format in BINARY_FORMATS:
+        try:
+            check_binary_format(export_format)
+        except FormatError as e:
+            return jsonify({'error': str(e)}), 400
+
+    if not schema_registry.has_table(table_name):
+        logging.error(f"Table not found in database: {table_name}")
+        return jsonify({'error': 'Table not found'}), 404
+
+    include_core = current_user.can_view_core_table()
+    if _background_requested():
+        return _enqueue('export', table_name, {'format': export_format, 'include_core': include_core})
+
+    table = schema_registry.get_table(table_name)
+    exporter, mimetype = EXPORT_FORMATS[export_format]
+    logging.info(f"Streaming {export_format} export of {table_name} for user {current_user.username}")
+    response = Response(
+        stream_with_context(exporter(table, table_name, include_core, current_app.config['EXPORT_CHUNK_ROWS'])),
+        mimetype=mimetype
+    )
+    response.headers['Content-Disposition'] = f'attachment; filename={table_name}.{export_format}'
+    return response
+
+def _projection_target(table_name):
+    if not current_user.can_edit(table_name) or not current_user.can_view_core_table():
+        return jsonify({'error': 'Access denied'}), 403
+    if not schema_registry.has_table(table_name) or TableMetadata.query.filter_by(table_name=table_name).first() is None:
+        return jsonify({'error': f'Table {table_name} not found'}), 404
+    return None
+
+@bp.route('/core_projection/<table_name>', methods=['POST'])
+@login_required
+def build_core_projection(table_name):
+    error = _projection_target(table_name)
+    if error is not None:
+        return error
+    if _background_requested():
+        return _enqueue('core_projection', table_name)
     try:
-        with db.engine.connect() as connection:
-            # Create sample tables
-            connection.execute(text("""
-                CREATE TABLE IF NOT EXISTS employees (
-                    id INTEGER PRIMARY KEY,
-                    name TEXT NOT NULL,
-                    position TEXT
-                )
-            """))
-            connection.execute(text("""
-                CREATE TABLE IF NOT EXISTS projects (
-                    id INTEGER PRIMARY KEY,
-                    name TEXT NOT NULL,
-                    status TEXT
-                )
-            """))
-            connection.execute(text("""
-                CREATE TABLE IF NOT EXISTS departments (
-                    id INTEGER PRIMARY KEY,
-                    name TEXT NOT NULL,
-                    head TEXT
-                )
-            """))
-
-            # Seed sample data
-            connection.execute(text("INSERT INTO employees (name, position) VALUES ('John Doe', 'Developer'), ('Jane Smith', 'Manager'), ('Bob Johnson', 'Designer')"))
-            connection.execute(text("INSERT INTO projects (name, status) VALUES ('Website Redesign', 'In Progress'), ('Mobile App Development', 'Planning'), ('Database Optimization', 'Completed')"))
-            connection.execute(text("INSERT INTO departments (name, head) VALUES ('IT', 'John Smith'), ('HR', 'Emily Brown'), ('Finance', 'David Wilson')"))
-
-            connection.commit()
-
-        # Add table metadata
-        for table_name in ['employees', 'projects', 'departments']:
-            if not TableMetadata.query.filter_by(table_name=table_name).first():
-                meta = TableMetadata(table_name=table_name, description=f"{table_name.capitalize()} Information")
-                db.session.add(meta)
+        core_projection.build(table_name)
+        db.session.commit()
+    except sqlalchemy.exc.SQLAlchemyError as e:
+        db.session.rollback()
+        logging.error(f"Error building core projection for {table_name}: {str(e)}")
+        return jsonify({'error': 'Database error occurred'}), 500
+    return jsonify({'success': True, 'core_projection': 'ready'})
 
+@bp.route('/core_projection/<table_name>', methods=['DELETE'])
+@login_required
+def drop_core_projection(table_name):
+    error = _projection_target(table_name)
+    if error is not None:
+        return error
+    try:
+        core_projection.drop(table_name)
         db.session.commit()
+    except sqlalchemy.exc.SQLAlchemyError as e:
+        db.session.rollback()
+        logging.error(f"Error dropping core projection for {table_name}: {str(e)}")
+        return jsonify({'error': 'Database error occurred'}), 500
+    return jsonify({'success': True, 'core_projection': None})
+
+@bp.route('/seed_sample_data')
+def seed_sample_data():
+    if _background_requested():
+        if not current_user.is_authenticated:
+            return jsonify({'error': 'Login required for background jobs'}), 401
+        return _enqueue('seed')
+    try:
+        seed_sample_tables()
         return jsonify({'message': 'Sample data and metadata seeded successfully'}), 200
     except Exception as e:
         db.session.rollback()
@@ -197,23 +472,28 @@ def add_table_data(table_name):
         logging.info(f"Received data for table {table_name}: {data}")
 
         # Check if the table exists
-        inspector = db.inspect(db.engine)
-        if not inspector.has_table(table_name):
+        if not schema_registry.has_table(table_name):
             return jsonify({'error': f'Table {table_name} not found'}), 404
 
         user_data = json.loads(data['user_data'])
         logging.info(f"Parsed user_data: {user_data}")
+        if not isinstance(user_data, dict):
+            return jsonify({'error': 'user_data must be an object'}), 400
 
         # Insert new row
-        columns = ', '.join(user_data.keys())
-        values = ', '.join([':' + k for k in user_data.keys()])
-        stmt = text(f"INSERT INTO {table_name} ({columns}) VALUES ({values})")
-        result = db.session.execute(stmt, user_data)
-        new_id = result.lastrowid
+        table = schema_registry.get_table(table_name)
+        result = db.session.execute(statement_cache.insert(table, user_data), user_data)
+        new_id = result.inserted_primary_key[0]
+        change_feed.record(table_name, [new_id], 'insert')
+        core_projection.refresh(table_name, [new_id])
+        TableMetadata.bump_version(table_name)
         db.session.commit()
         logging.info(f"Inserted new row with id {new_id}")
         return jsonify({'success': True, 'id': new_id})
 
+    except UnknownColumnError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
     except json.JSONDecodeError as e:
         db.session.rollback()
         logging.error(f"JSON decode error: {str(e)}")
@@ -242,19 +522,21 @@ def update_table_data(table_name):
         logging.info(f"Received data for table {table_name}: {data}")
 
         # Check if the table exists
-        inspector = db.inspect(db.engine)
-        if not inspector.has_table(table_name):
+        if not schema_registry.has_table(table_name):
             return jsonify({'error': f'Table {table_name} not found'}), 404
 
-        user_data = json.loads(data['user_data'])
+        # the dashboard sends only the side of the row that was edited
+        user_data = json.loads(data.get('user_data', '{}'))
         core_data = json.loads(data.get('core_data', '{}'))
+        if not isinstance(user_data, dict):
+            return jsonify({'error': 'user_data must be an object'}), 400
+        table = schema_registry.get_table(table_name)
         
         if data['id']:
             # Update existing row
-            set_clause = ', '.join([f"{k} = :{k}" for k in user_data.keys()])
-            stmt = text(f"UPDATE {table_name} SET {set_clause} WHERE id = :id")
-            user_data['id'] = data['id']
-            db.session.execute(stmt, user_data)
+            if user_data:
+                db.session.execute(statement_cache.update(table, user_data), statement_cache.update_params(table, user_data, data['id']))
+            change_feed.record(table_name, [data['id']])
             
             if current_user.can_edit_core_table() and core_data:
                 association = CoreTableAssociation.query.filter_by(table_name=table_name, table_id=data['id']).first()
@@ -262,6 +544,9 @@ def update_table_data(table_name):
                     core = association.core
                     for key, value in core_data.items():
                         setattr(core, key, value)
+                    change_feed.record_core([core.id])
+                    # shared core rows show up in other projected rows too
+                    core_projection.refresh_core([core.id])
                 else:
                     core = CoreTable(**core_data)
                     db.session.add(core)
@@ -270,11 +555,9 @@ def update_table_data(table_name):
                     db.session.add(association)
         else:
             # Insert new row
-            columns = ', '.join(user_data.keys())
-            values = ', '.join([':' + k for k in user_data.keys()])
-            stmt = text(f"INSERT INTO {table_name} ({columns}) VALUES ({values})")
-            result = db.session.execute(stmt, user_data)
-            new_id = result.lastrowid
+            result = db.session.execute(statement_cache.insert(table, user_data), user_data)
+            new_id = result.inserted_primary_key[0]
+            change_feed.record(table_name, [new_id], 'insert')
             
             if current_user.can_edit_core_table() and core_data:
                 core = CoreTable(**core_data)
@@ -283,22 +566,140 @@ def update_table_data(table_name):
                 association = CoreTableAssociation(table_name=table_name, table_id=new_id, core_id=core.id)
                 db.session.add(association)
 
+        core_projection.refresh(table_name, [new_id if 'new_id' in locals() else data['id']])
+        if current_user.can_edit_core_table() and core_data:
+            TableMetadata.bump_version()
+        else:
+            TableMetadata.bump_version(table_name)
         db.session.commit()
         return jsonify({'success': True, 'id': new_id if 'new_id' in locals() else data['id']})
 
+    except UnknownColumnError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         db.session.rollback()
         logging.error(f"Unexpected error in update_table_data: {str(e)}")
         return jsonify({'error': 'An unexpected error occurred', 'details': str(e)}), 500
 
+@bp.route('/bulk_table_data/<table_name>', methods=['POST'])
+@login_required
+def bulk_table_data(table_name):
+    if not current_user.can_edit(table_name):
+        return jsonify({'error': 'Access denied'}), 403
+
+    if not schema_registry.has_table(table_name):
+        return jsonify({'error': f'Table {table_name} not found'}), 404
+
+    if _background_requested():
+        # the body is spooled to disk and parsed by the job, so there is no row limit
+        params = {'mimetype': request.mimetype, 'edit_core': current_user.can_edit_core_table()}
+        return _enqueue('import', table_name, params, upload=request.stream)
+
+    try:
+        rows = parse_rows(request)
+    except RowError as e:
+        return jsonify({'error': str(e)}), 400
+    if not rows:
+        return jsonify({'error': 'No data provided'}), 400
+    if len(rows) > current_app.config['BULK_MAX_ROWS']:
+        return jsonify({'error': f"At most {current_app.config['BULK_MAX_ROWS']} rows per request"}), 413
+
+    table = schema_registry.get_table(table_name)
+    try:
+        results, written = load_rows(table, table_name, rows, current_user.can_edit_core_table())
+        db.session.commit()
+    except sqlalchemy.exc.SQLAlchemyError as e:
+        db.session.rollback()
+        logging.error(f"Database error in bulk_table_data: {str(e)}")
+        return jsonify({'error': 'Database error occurred'}), 500
+
+    logging.info(f"Bulk wrote {written} rows to {table_name}, {len(rows) - written} rejected")
+    return jsonify({'success': written == len(rows), 'written': written, 'results': results})
+
+@bp.route('/import_table_data/<table_name>', methods=['POST'])
+@login_required
+def import_table_data(table_name):
+    if not current_user.can_edit(table_name):
+        return jsonify({'error': 'Access denied'}), 403
+
+    if not schema_registry.has_table(table_name):
+        return jsonify({'error': f'Table {table_name} not found'}), 404
+
+    file_format = request.args.get('format') or IMPORT_MIMETYPES.get(request.mimetype, request.mimetype)
+    try:
+        check_format(file_format)
+    except UploadError as e:
+        return jsonify({'error': str(e)}), 400
+    if _background_requested():
+        return _enqueue('import_file', table_name, {'format': file_format}, upload=request.stream)
+
+    table = schema_registry.get_table(table_name)
+    try:
+        # the body is read in IMPORT_CHUNK_ROWS batches, never held in memory at once
+        written = import_file(table, table_name, file_format, request.stream, current_app.config['IMPORT_CHUNK_ROWS'])
+        db.session.commit()
+    except UploadError as e:
+        db.session.rollback()
+        logging.warning(f"Rejected {file_format} import into {table_name}: {str(e)}")
+        return jsonify({'error': str(e)}), 400
+    except sqlalchemy.exc.SQLAlchemyError as e:
+        db.session.rollback()
+        logging.error(f"Database error in import_table_data: {str(e)}")
+        return jsonify({'error': 'Database error occurred'}), 500
+
+    logging.info(f"Imported {written} rows from {file_format} into {table_name}")
+    return jsonify({'success': True, 'written': written})
+
+@bp.route('/jobs')
+@login_required
+def list_jobs():
+    jobs = Job.query.filter_by(user_id=current_user.id).order_by(Job.id.desc()).limit(50).all()
+    return jsonify({'jobs': [job.to_dict() for job in jobs]})
+
+@bp.route('/jobs/<int:job_id>')
+@login_required
+def get_job(job_id):
+    job = Job.query.filter_by(id=job_id, user_id=current_user.id).first()
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job.to_dict())
+
+@bp.route('/jobs/<int:job_id>/download')
+@login_required
+def download_job(job_id):
+    job = Job.query.filter_by(id=job_id, user_id=current_user.id).first()
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    if job.kind != 'export' or job.status != 'succeeded':
+        return jsonify({'error': 'No file for this job'}), 409
+    result = json.loads(job.result)
+    return send_file(
+        job_queue.path(job.id, result['format']),
+        mimetype=result['mimetype'],
+        as_attachment=True,
+        download_name=f"{job.table_name}.{result['format']}"
+    )
+
 @bp.route('/test_users')
 def test_users():
     users = User.query.all()
     user_list = [{"id": user.id, "username": user.username, "password_hash": user.password_hash} for user in users]
     return jsonify(user_list)
 
+@bp.route('/metrics')
+def metrics_endpoint():
+    token = current_app.config['METRICS_TOKEN']
+    authorization = request.headers.get('Authorization', '')
+    allowed = (token and hmac.compare_digest(authorization.encode(), f'Bearer {token}'.encode())) \
+        or request.remote_addr in current_app.config['METRICS_ALLOWED_IPS']
+    if not allowed:
+        return jsonify({'error': 'Access denied'}), 403
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
 @bp.route('/check_edit_permission/<table_name>')
 @login_required
+@read_replica
 def check_edit_permission(table_name):
     can_edit = current_user.can_edit(table_name)
     return jsonify({'canEdit': can_edit})
@@ -0,0 +1,54 @@
+from sqlalchemy import text
+from app import db, schema_registry, change_feed, core_projection
+from app.models import TableMetadata
+
+SAMPLE_TABLES = ['employees', 'projects', 'departments']
+
+
+def seed_sample_tables():
+    """Create the sample tables, insert their rows and register them in table_metadata."""
+    with db.engine.connect() as connection:
+        # Create sample tables
+        connection.execute(text("""
+            CREATE TABLE IF NOT EXISTS employees (
+                id INTEGER PRIMARY KEY,
+                name TEXT NOT NULL,
+                position TEXT
+            )
+        """))
+        connection.execute(text("""
+            CREATE TABLE IF NOT EXISTS projects (
+                id INTEGER PRIMARY KEY,
+                name TEXT NOT NULL,
+                status TEXT
+            )
+        """))
+        connection.execute(text("""
+            CREATE TABLE IF NOT EXISTS departments (
+                id INTEGER PRIMARY KEY,
+                name TEXT NOT NULL,
+                head TEXT
+            )
+        """))
+
+        # Seed sample data
+        connection.execute(text("INSERT INTO employees (name, position) VALUES ('John Doe', 'Developer'), ('Jane Smith', 'Manager'), ('Bob Johnson', 'Designer')"))
+        connection.execute(text("INSERT INTO projects (name, status) VALUES ('Website Redesign', 'In Progress'), ('Mobile App Development', 'Planning'), ('Database Optimization', 'Completed')"))
+        connection.execute(text("INSERT INTO departments (name, head) VALUES ('IT', 'John Smith'), ('HR', 'Emily Brown'), ('Finance', 'David Wilson')"))
+
+        connection.commit()
+    schema_registry.invalidate()
+
+    # Add table metadata
+    for table_name in SAMPLE_TABLES:
+        if not TableMetadata.query.filter_by(table_name=table_name).first():
+            meta = TableMetadata(table_name=table_name, description=f"{table_name.capitalize()} Information")
+            db.session.add(meta)
+    db.session.flush()
+    TableMetadata.bump_version(*SAMPLE_TABLES)
+    for table_name in SAMPLE_TABLES:
+        change_feed.record(table_name, op='reload')
+        core_projection.reload(table_name)
+        core_projection.sync(table_name)
+
+    db.session.commit()
@@ -0,0 +1,99 @@
+import logging
+import threading
+import time
+from sqlalchemy import MetaData, Table, inspect
+
+
+def python_type(column, default=None):
+    """The Python type of a column's values, or `default` for types SQLAlchemy cannot map."""
+    try:
+        return column.type.python_type
+    except NotImplementedError:
+        return default
+
+
+def required_columns(table):
+    """Columns an INSERT must set: NOT NULL, no default, not the primary key."""
+    return [
+        column for column in table.columns
+        if not column.nullable and not column.primary_key and column.default is None and column.server_default is None
+    ]
+
+
+class SchemaRegistry:
+    """Process-wide cache of reflected user tables and the table-name set."""
+
+    def __init__(self, db, ttl=300):
+        self.db = db
+        self.ttl = ttl
+        self.metadata = MetaData()
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._tables = {}
+        self._table_names = None
+        self._names_loaded_at = 0.0
+
+    def init_app(self, app):
+        self.ttl = app.config.get('SCHEMA_CACHE_TTL', self.ttl)
+        app.extensions['schema_registry'] = self
+
+    def _expired(self, loaded_at):
+        return self.ttl is not None and time.monotonic() - loaded_at > self.ttl
+
+    def get_table_names(self):
+        with self._lock:
+            if self._table_names is not None and not self._expired(self._names_loaded_at):
+                self.hits += 1
+                return self._table_names
+            self.misses += 1
+            self._table_names = frozenset(inspect(self.db.engine).get_table_names())
+            self._names_loaded_at = time.monotonic()
+            return self._table_names
+
+    def has_table(self, table_name):
+        return table_name in self.get_table_names()
+
+    def get_table(self, table_name):
+        with self._lock:
+            cached = self._tables.get(table_name)
+            if cached is not None and not self._expired(cached[1]):
+                self.hits += 1
+                return cached[0]
+            self.misses += 1
+            if cached is not None:
+                self.metadata.remove(cached[0])
+            table = Table(table_name, self.metadata, autoload_with=self.db.engine)
+            self._tables[table_name] = (table, time.monotonic())
+            return table
+
+    def invalidate(self, table_name=None):
+        with self._lock:
+            if table_name is None:
+                self._tables.clear()
+                self.metadata.clear()
+            else:
+                cached = self._tables.pop(table_name, None)
+                if cached is not None:
+                    self.metadata.remove(cached[0])
+            self._table_names = None
+        logging.info(f"Schema cache invalidated: {table_name or 'all tables'}")
+
+    def metrics_lines(self):
+        stats = self.stats()
+        return [
+            '# TYPE ncdb_schema_cache_hits_total counter',
+            f"ncdb_schema_cache_hits_total {stats['hits']}",
+            '# TYPE ncdb_schema_cache_misses_total counter',
+            f"ncdb_schema_cache_misses_total {stats['misses']}",
+            '# TYPE ncdb_schema_cache_tables gauge',
+            f"ncdb_schema_cache_tables {stats['cached_tables']}",
+        ]
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'cached_tables': len(self._tables),
+            }
@@ -0,0 +1,105 @@
+import datetime
+import io
+import json
+from flask import current_app
+from app.schema import python_type
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+except ImportError:
+    pyarrow = None
+
+# format=<name> alternatives to JSON for clients loading whole pages or tables into dataframes
+BINARY_FORMATS = {
+    'msgpack': ('application/x-msgpack', 'msgpack'),
+    'arrow': ('application/vnd.apache.arrow.stream', 'pyarrow'),
+}
+
+
+class FormatError(ValueError):
+    pass
+
+
+def dumps(obj):
+    """Serialize to JSON bytes, using orjson when it is installed."""
+    if orjson is not None:
+        return orjson.dumps(obj, default=str, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, default=str, separators=(',', ':')).encode()
+
+
+def json_response(obj, status=200):
+    return current_app.response_class(dumps(obj), status=status, mimetype='application/json')
+
+
+def check_binary_format(name):
+    """Raise FormatError unless the library behind BINARY_FORMATS[name] is installed."""
+    module = {'msgpack': msgpack, 'arrow': pyarrow}[name]
+    if module is None:
+        raise FormatError(f"{name} responses require {BINARY_FORMATS[name][1]}")
+
+
+def _packable(value):
+    # dates as ISO strings, the same as orjson writes them
+    return value.isoformat() if isinstance(value, (datetime.date, datetime.time)) else str(value)
+
+
+def pack(obj):
+    return msgpack.packb(obj, default=_packable, use_bin_type=True)
+
+
+def arrow_type(column):
+    """The Arrow type for a SQLAlchemy column, or None if it has no direct mapping."""
+    return {
+        bool: pyarrow.bool_(),
+        int: pyarrow.int64(),
+        float: pyarrow.float64(),
+        str: pyarrow.string(),
+        datetime.date: pyarrow.date32(),
+        datetime.datetime: pyarrow.timestamp('us'),
+    }.get(python_type(column, str))
+
+
+def arrow_schema(columns, names=None, metadata=None):
+    """Schema for SQLAlchemy `columns`, optionally renamed; unmapped types are sent as strings."""
+    names = names or [column.name for column in columns]
+    return pyarrow.schema(
+        [pyarrow.field(name, arrow_type(column) or pyarrow.string()) for name, column in zip(names, columns)],
+        metadata=metadata
+    )
+
+
+def arrow_batch(schema, rows):
+    arrays = []
+    for field, values in zip(schema, zip(*rows) if rows else [()] * len(schema)):
+        if field.type == pyarrow.string():
+            values = [None if value is None else str(value) for value in values]
+        try:
+            arrays.append(pyarrow.array(values, type=field.type))
+        except (pyarrow.ArrowInvalid, pyarrow.ArrowTypeError) as e:
+            # SQLite lets any value into any column
+            raise FormatError(f"Column {field.name}: {e}")
+    return pyarrow.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def iter_arrow_stream(schema, batches):
+    """Yield an Arrow IPC stream piece by piece: the schema, each batch, then the end marker."""
+    sink = io.BytesIO()
+    writer = pyarrow.ipc.new_stream(sink, schema)
+    for batch in batches:
+        writer.write_batch(batch)
+        yield sink.getvalue()
+        sink.seek(0)
+        sink.truncate()
+    writer.close()
+    yield sink.getvalue()
@@ -0,0 +1,118 @@
+import threading
+from collections import OrderedDict
+from sqlalchemy import MetaData, bindparam, insert, update
+
+
+class UnknownColumnError(ValueError):
+    pass
+
+
+def row_key(table):
+    """Bind name for the row id in cached UPDATEs, clear of the table's own columns."""
+    name = '_pk_id'
+    while name in table.c:
+        name = '_' + name
+    return name
+
+
+class StatementCache:
+    """LRU of INSERT/UPDATE constructs per (table, operation, column set).
+
+    Handing out the same construct for the same shape of write keeps
+    SQLAlchemy's compiled cache warm and gives the driver identical SQL to
+    reuse as a prepared statement. Updates match on the row_key() parameter;
+    build their parameters with update_params().
+    Column names are checked against the reflected table before anything
+    is built; a reflected table that is reloaded simply stops being hit.
+    """
+
+    def __init__(self, max_size=256):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._statements = OrderedDict()
+
+    def init_app(self, app):
+        self.max_size = app.config.get('STATEMENT_CACHE_SIZE', self.max_size)
+        app.extensions['statements'] = self
+
+    def insert(self, table, columns):
+        return self._get(table, 'insert', columns)
+
+    def insert_returning(self, table, columns):
+        return self._get(table, 'insert_returning', columns)
+
+    def update(self, table, columns):
+        return self._get(table, 'update', columns)
+
+    def update_params(self, table, user_data, row_id):
+        return {**user_data, row_key(table): row_id}
+
+    def check_columns(self, table, columns):
+        unknown = [name for name in columns if name == 'id' or name not in table.c]
+        if unknown:
+            raise UnknownColumnError(f"Unknown columns: {', '.join(map(str, unknown))}")
+
+    def _build(self, table, operation, names):
+        values = {name: bindparam(name, type_=table.c[name].type) for name in names}
+        if operation == 'insert':
+            return insert(table).values(values)
+        if operation == 'insert_returning':
+            # SQLite reflects INTEGER PRIMARY KEY as nullable, which rules it out
+            # as the sentinel that keeps RETURNING in parameter order; mark it on
+            # a private copy so the shared reflected table stays as reflected
+            target = table.to_metadata(MetaData())
+            target.c.id.nullable = False
+            return insert(target).values(values).returning(target.c.id, sort_by_parameter_order=True)
+        return update(table).where(table.c.id == bindparam(row_key(table))).values(values)
+
+    def _get(self, table, operation, columns):
+        names = tuple(sorted(columns))
+        key = (table, operation, names)
+        with self._lock:
+            statement = self._statements.get(key)
+            if statement is not None:
+                self._statements.move_to_end(key)
+                self.hits += 1
+                return statement
+        self.check_columns(table, names)
+        if operation == 'update' and not names:
+            raise UnknownColumnError('No columns to update')
+        statement = self._build(table, operation, names)
+        with self._lock:
+            self.misses += 1
+            self._statements[key] = statement
+            while len(self._statements) > self.max_size:
+                self._statements.popitem(last=False)
+                self.evictions += 1
+        return statement
+
+    def clear(self):
+        with self._lock:
+            self._statements.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'size': len(self._statements),
+                'hit_rate': self.hits / lookups if lookups else None,
+            }
+
+    def metrics_lines(self):
+        stats = self.stats()
+        return [
+            '# TYPE ncdb_statement_cache_hits_total counter',
+            f"ncdb_statement_cache_hits_total {stats['hits']}",
+            '# TYPE ncdb_statement_cache_misses_total counter',
+            f"ncdb_statement_cache_misses_total {stats['misses']}",
+            '# TYPE ncdb_statement_cache_evictions_total counter',
+            f"ncdb_statement_cache_evictions_total {stats['evictions']}",
+            '# TYPE ncdb_statement_cache_statements gauge',
+            f"ncdb_statement_cache_statements {stats['size']}",
+        ]
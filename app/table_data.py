@@ -0,0 +1,55 @@
+import json
+from sqlalchemy import select
+from app.models import CoreTable, CoreTableAssociation
+
+
+def core_data_statement(table_name, table_ids):
+    """SELECT table_id and the core fields for `table_ids` (a list or a subquery)."""
+    core = CoreTable.__table__
+    assoc = CoreTableAssociation.__table__
+    return select(assoc.c.table_id, *[core.c[field] for field in CoreTable.get_fields()]).join(
+        core, core.c.id == assoc.c.core_id
+    ).where(assoc.c.table_name == table_name, assoc.c.table_id.in_(table_ids))
+
+
+def core_data_by_id(rows):
+    return {row[0]: tuple(row[1:]) for row in rows}
+
+
+def table_payload(columns, rows, core_by_id=None, columnar=False, next_cursor=None, total=None, total_estimated=False,
+                  offset=None):
+    """Build a spreadsheet/list page from plain user rows and {table_id: core values}.
+
+    `core_by_id` is None when the user cannot see core data.
+    """
+    core_fields = CoreTable.get_fields() if core_by_id is not None else []
+    id_index = columns.index('id')
+    if columnar:
+        # column names once, rows as arrays of native values
+        if core_by_id is None:
+            data = [list(row) for row in rows]
+        else:
+            empty_core = (None,) * len(core_fields)
+            data = [[*row, *core_by_id.get(row[id_index], empty_core)] for row in rows]
+        return {
+            'columns': columns,
+            'core_columns': core_fields,
+            'rows': data,
+            'next_cursor': next_cursor,
+            'total': total,
+            'total_estimated': total_estimated,
+            'offset': offset
+        }
+
+    data = []
+    for row in rows:
+        row_dict = dict(zip(columns, row))
+        core = core_by_id.get(row[id_index]) if core_by_id is not None else None
+        data.append({
+            'id': row[id_index],
+            'user_data': json.dumps({k: str(v) for k, v in row_dict.items() if k != 'id'}),
+            'core_data': json.dumps(dict(zip(core_fields, core)) if core is not None else {}, default=str)
+        })
+    return {
+        'rows': data, 'next_cursor': next_cursor, 'total': total, 'total_estimated': total_estimated, 'offset': offset
+    }
@@ -0,0 +1,165 @@
+import logging
+import threading
+import time
+from sqlalchemy import exc, func, select, text, update
+
+COUNT_MODES = ('exact', 'estimate', 'none')
+
+
+def _sqlite_stats(connection, table_name, analysis_limit):
+    # ANALYZE with analysis_limit samples a bounded number of rows per index,
+    # so sqlite_stat1 holds an approximate row count without a full scan
+    quoted = connection.dialect.identifier_preparer.quote(table_name)
+    connection.exec_driver_sql(f'PRAGMA analysis_limit={int(analysis_limit)}')
+    connection.exec_driver_sql(f'ANALYZE {quoted}')
+    stats = connection.execute(text('SELECT stat FROM sqlite_stat1 WHERE tbl = :name'), {'name': table_name}).scalars()
+    # no sqlite_stat1 row after ANALYZE means the table is empty
+    rows = max((int(stat.split()[0]) for stat in stats if stat), default=0)
+    try:
+        # dbstat is a compile-time option; the size is optional
+        size = connection.execute(text(
+            'SELECT SUM(pgsize) FROM dbstat WHERE aggregate = TRUE AND name IN '
+            '(SELECT name FROM sqlite_master WHERE tbl_name = :name)'
+        ), {'name': table_name}).scalar()
+    except exc.OperationalError:
+        size = None
+    return rows, size
+
+
+def _postgresql_stats(connection, table_name, analysis_limit):
+    quoted = connection.dialect.identifier_preparer.quote(table_name)
+    row = connection.execute(text(
+        'SELECT c.reltuples::bigint, pg_total_relation_size(c.oid) FROM pg_class c WHERE c.oid = to_regclass(:name)'
+    ), {'name': quoted}).first()
+    if row is None:
+        return None, None
+    # reltuples is -1 until the table has been vacuumed or analyzed
+    return (row[0] if row[0] >= 0 else None), row[1]
+
+
+def _mysql_stats(connection, table_name, analysis_limit):
+    row = connection.execute(text(
+        'SELECT TABLE_ROWS, DATA_LENGTH + INDEX_LENGTH FROM information_schema.TABLES '
+        'WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :name'
+    ), {'name': table_name}).first()
+    return tuple(row) if row is not None else (None, None)
+
+
+ESTIMATORS = {
+    'sqlite': _sqlite_stats,
+    'postgresql': _postgresql_stats,
+    'mysql': _mysql_stats,
+}
+
+
+def default_count_mode(table_query, row_estimate):
+    """The count mode when the request has no count=.
+
+    Only unfiltered first pages of analyzed tables get a total by default;
+    clients that need one elsewhere ask for count=exact.
+    """
+    if table_query.is_first_page and not table_query.is_filtered and row_estimate is not None:
+        return 'estimate'
+    return 'none'
+
+
+def estimated_total(table_query, row_estimate, exact_below):
+    """The stored estimate if it can stand in for COUNT(*) on this query, else None.
+
+    Filtered queries and small tables, where an exact count is cheap, always count.
+    """
+    if table_query.is_filtered or row_estimate is None or row_estimate < exact_below:
+        return None
+    return row_estimate
+
+
+class TableStats:
+    """Row estimates and on-disk sizes for user tables, kept on table_metadata.
+
+    Estimates come from the database's own statistics and are refreshed by a
+    background thread, so neither the dashboard nor pagination run COUNT(*)
+    over large tables.
+    """
+
+    def __init__(self, db, schema_registry, interval=300):
+        self.db = db
+        self.schema_registry = schema_registry
+        self.interval = interval
+        self.analysis_limit = 1000
+        self.refreshes = 0
+        self.failures = 0
+        self.last_duration = 0.0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._worker = None
+
+    def init_app(self, app):
+        self.interval = app.config.get('TABLE_STATS_REFRESH_SECONDS', self.interval)
+        self.analysis_limit = app.config.get('SQLITE_ANALYSIS_LIMIT', self.analysis_limit)
+        app.extensions['table_stats'] = self
+        if self.interval:
+            app.before_request(lambda: self.start(app))
+
+    def start(self, app):
+        # started from the first request rather than create_app, so the thread
+        # lives in the serving process (not a pre-fork master or a CLI command)
+        if self._worker is not None:
+            return
+        with self._lock:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, args=(app,), name='table-stats', daemon=True)
+                self._worker.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self, app):
+        while not self._stop.is_set():
+            with app.app_context():
+                try:
+                    self.refresh()
+                except Exception as e:
+                    self.failures += 1
+                    logging.error(f"Table stats refresh failed: {str(e)}")
+            self._stop.wait(self.interval)
+
+    def estimate(self, connection, table_name):
+        """(row estimate, size in bytes) for `table_name`; either may be None."""
+        estimator = ESTIMATORS.get(connection.dialect.name)
+        if estimator is None:
+            # no cheap source on this backend; this only ever runs in the background
+            table = self.schema_registry.get_table(table_name)
+            return connection.execute(select(func.count()).select_from(table)).scalar(), None
+        return estimator(connection, table_name, self.analysis_limit)
+
+    def refresh(self, table_names=None):
+        """Re-estimate `table_names`, or every table listed in table_metadata."""
+        from app.models import TableMetadata, utcnow  # app.models imports app
+        start = time.perf_counter()
+        meta = TableMetadata.__table__
+        query = select(meta.c.table_name)
+        if table_names:
+            query = query.where(meta.c.table_name.in_(table_names))
+        existing = self.schema_registry.get_table_names()
+        with self.db.engine.connect() as connection:
+            names = [name for name in connection.execute(query).scalars() if name in existing]
+        for table_name in names:
+            # one short transaction per table: on SQLite, ANALYZE and the update both take the write lock
+            with self.db.engine.begin() as connection:
+                rows, size = self.estimate(connection, table_name)
+                connection.execute(update(meta).where(meta.c.table_name == table_name).values(
+                    row_estimate=rows, size_bytes=size, stats_updated_at=utcnow()
+                ))
+        self.refreshes += 1
+        self.last_duration = time.perf_counter() - start
+        logging.info(f"Refreshed table stats for {len(names)} tables in {self.last_duration * 1000:.1f} ms")
+
+    def metrics_lines(self):
+        return [
+            '# TYPE ncdb_table_stats_refreshes_total counter',
+            f'ncdb_table_stats_refreshes_total {self.refreshes}',
+            '# TYPE ncdb_table_stats_refresh_failures_total counter',
+            f'ncdb_table_stats_refresh_failures_total {self.failures}',
+            '# TYPE ncdb_table_stats_refresh_seconds gauge',
+            f'ncdb_table_stats_refresh_seconds {self.last_duration}',
+        ]
@@ -0,0 +1,153 @@
+import threading
+import time
+from collections import OrderedDict
+from flask import has_request_context, session
+from sqlalchemy import event, select
+from sqlalchemy.orm import object_session
+
+
+class UserCache:
+    """LRU/TTL cache of SessionUser snapshots behind the login_manager user loader.
+
+    A cached user is trusted for `ttl` seconds, then revalidated by reading
+    only its version column; a full reload happens when the version moved.
+    Commits changing a user in this process drop it right away. With
+    `session_snapshot` the user is also kept in the signed session cookie, so
+    a worker that has not seen the user yet starts from there instead of
+    the database.
+    """
+
+    SESSION_KEY = 'user_snapshot'
+
+    def __init__(self, db, max_size=1024, ttl=30, session_snapshot=True):
+        self.db = db
+        self.max_size = max_size
+        self.ttl = ttl
+        self.session_snapshot = session_snapshot
+        self.model = None
+        self.hits = 0
+        self.revalidations = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._users = OrderedDict()
+        # user id -> when this process last saw it change; older snapshots are not trusted
+        self._changed = OrderedDict()
+
+    def init_app(self, app):
+        from app.models import User  # app.models imports app
+        self.model = User
+        self.max_size = app.config.get('USER_CACHE_SIZE', self.max_size)
+        self.ttl = app.config.get('USER_CACHE_TTL', self.ttl)
+        self.session_snapshot = app.config.get('USER_SESSION_SNAPSHOT', self.session_snapshot)
+        if not event.contains(self.db.session.session_factory.class_, 'after_commit', self._after_commit):
+            event.listen(self.db.session.session_factory.class_, 'after_commit', self._after_commit)
+            event.listen(self.db.session.session_factory.class_, 'after_soft_rollback', self._after_rollback)
+            event.listen(User, 'after_update', self._user_changed)
+            event.listen(User, 'after_delete', self._user_changed)
+        app.extensions['user_cache'] = self
+
+    def _user_changed(self, mapper, connection, target):
+        object_session(target).info.setdefault('changed_users', set()).add(target.id)
+
+    def _after_commit(self, db_session):
+        for user_id in db_session.info.pop('changed_users', ()):
+            self.invalidate(user_id)
+
+    def _after_rollback(self, db_session, previous_transaction):
+        db_session.info.pop('changed_users', None)
+
+    def invalidate(self, user_id=None):
+        with self._lock:
+            if user_id is None:
+                self._users.clear()
+            else:
+                self._users.pop(user_id, None)
+                self._changed[user_id] = time.time()
+                self._changed.move_to_end(user_id)
+                while len(self._changed) > self.max_size:
+                    self._changed.popitem(last=False)
+
+    def _store(self, user, checked_at):
+        with self._lock:
+            self._users[user.id] = (user, checked_at)
+            self._users.move_to_end(user.id)
+            while len(self._users) > self.max_size:
+                self._users.popitem(last=False)
+        if self.session_snapshot and has_request_context():
+            session[self.SESSION_KEY] = dict(user.to_snapshot(), checked_at=checked_at)
+
+    def _from_session(self, user_id):
+        from app.models import SessionUser
+        snapshot = session.get(self.SESSION_KEY) if self.session_snapshot and has_request_context() else None
+        if not snapshot or snapshot.get('id') != user_id:
+            return None
+        try:
+            user, checked_at = SessionUser.from_snapshot(snapshot), float(snapshot['checked_at'])
+        except (KeyError, TypeError, ValueError):
+            return None
+        with self._lock:
+            changed_at = self._changed.get(user_id)
+        if changed_at is not None and checked_at <= changed_at:
+            # revalidated below instead of trusted for the rest of its ttl
+            checked_at = 0.0
+        return user, checked_at
+
+    def load(self, user_id):
+        """The SessionUser for `user_id`, or None if it no longer exists or is inactive."""
+        from app.models import SessionUser
+        now = time.time()
+        with self._lock:
+            entry = self._users.get(user_id)
+            if entry is not None:
+                self._users.move_to_end(user_id)
+        if entry is None:
+            entry = self._from_session(user_id)
+        if entry is not None:
+            user, checked_at = entry
+            if now - checked_at < self.ttl:
+                with self._lock:
+                    self.hits += 1
+                if user_id not in self._users:
+                    self._store(user, checked_at)
+                return user
+            version = self.db.session.execute(select(self.model.version).where(self.model.id == user_id)).scalar()
+            if version == user.version:
+                with self._lock:
+                    self.revalidations += 1
+                self._store(user, now)
+                return user
+
+        with self._lock:
+            self.misses += 1
+        Model = self.model
+        row = self.db.session.execute(
+            select(*(getattr(Model, field) for field in SessionUser.FIELDS)).where(Model.id == user_id)
+        ).first()
+        if row is None or not row.is_active:
+            self.invalidate(user_id)
+            return None
+        user = SessionUser.from_row(row)
+        self._store(user, now)
+        return user
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'revalidations': self.revalidations,
+                'misses': self.misses,
+                'cached_users': len(self._users),
+            }
+
+    def metrics_lines(self):
+        stats = self.stats()
+        return [
+            '# TYPE ncdb_user_cache_hits_total counter',
+            f"ncdb_user_cache_hits_total {stats['hits']}",
+            '# TYPE ncdb_user_cache_revalidations_total counter',
+            f"ncdb_user_cache_revalidations_total {stats['revalidations']}",
+            '# TYPE ncdb_user_cache_misses_total counter',
+            f"ncdb_user_cache_misses_total {stats['misses']}",
+            '# TYPE ncdb_user_cache_users gauge',
+            f"ncdb_user_cache_users {stats['cached_users']}",
+        ]
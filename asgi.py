@@ -0,0 +1,7 @@
+from app import create_app
+from app.async_api import AsyncDataAPI, ThreadedWsgiToAsgi
+
+flask_app = create_app()
+app = AsyncDataAPI(flask_app, fallback=ThreadedWsgiToAsgi(flask_app, flask_app.config['ASGI_WSGI_THREADS']))
+
+# run with an ASGI server, e.g. `uvicorn asgi:app`
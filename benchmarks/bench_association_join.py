@@ -0,0 +1,73 @@
+"""Join and lookup cost on core_table_association with and without its indexes.
+
+Usage: python benchmarks/bench_association_join.py [--associations 1000000]
+"""
+import argparse
+import random
+
+from common import bench_app, populate, timed
+from sqlalchemy import func, select
+from app import db
+from app.models import CoreTable, CoreTableAssociation
+
+TABLE_NAME = 'bench_items'
+
+
+def run_queries(items, rows, repeat):
+    def page(after):
+        db.session.query(items, CoreTable).outerjoin(
+            CoreTableAssociation,
+            (CoreTableAssociation.table_name == TABLE_NAME) & (CoreTableAssociation.table_id == items.c.id)
+        ).outerjoin(CoreTable).filter(items.c.id > after).order_by(items.c.id).limit(100).all()
+
+    def full_join():
+        db.session.execute(select(func.count()).select_from(items.outerjoin(
+            CoreTableAssociation,
+            (CoreTableAssociation.table_name == TABLE_NAME) & (CoreTableAssociation.table_id == items.c.id)
+        ))).scalar()
+
+    ids = random.Random(0).sample(range(1, rows + 1), 200)
+
+    def lookups():
+        for table_id in ids:
+            CoreTableAssociation.query.filter_by(table_name=TABLE_NAME, table_id=table_id).first()
+
+    return {
+        'first_page_ms': timed(lambda: page(0), repeat),
+        'deep_page_ms': timed(lambda: page(rows // 2), repeat),
+        'full_join_count_ms': timed(full_join, max(1, repeat // 5)),
+        'lookup_200_ms': timed(lookups, max(1, repeat // 5)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--associations', type=int, default=1000000)
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+
+    app = bench_app()
+    with app.app_context():
+        db.create_all()
+        indexes = list(CoreTableAssociation.__table__.indexes)
+        for index in indexes:
+            index.drop(db.engine)
+
+        print(f"Populating {args.rows} rows and {args.associations} associations...")
+        items = populate(TABLE_NAME, args.rows, max(args.associations, args.rows))
+
+        before = run_queries(items, args.rows, args.repeat)
+        for index in indexes:
+            index.create(db.engine)
+        with db.engine.begin() as connection:
+            connection.exec_driver_sql('ANALYZE')
+        after = run_queries(items, args.rows, args.repeat)
+
+    print(f"{'query':<22}{'no index':>12}{'indexed':>12}")
+    for key in before:
+        print(f"{key:<22}{before[key]:>10.2f}ms{after[key]:>10.2f}ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""Page fetch with core data: ORM outer join vs. plain rows plus one IN query.
+
+Usage: python benchmarks/bench_core_fetch.py [--rows 100000] [--width 12]
+"""
+import argparse
+import json
+
+from common import bench_app, populate, timed
+from app import db
+from app.models import CoreTable, CoreTableAssociation
+from app.table_data import core_data_by_id, core_data_statement, table_payload
+
+TABLE_NAME = 'bench_wide'
+
+
+def orm_join_page(table, columns, after, limit):
+    # the pre-existing path: CoreTable entities per row, getattr over get_fields()
+    result = db.session.query(table, CoreTable).outerjoin(
+        CoreTableAssociation,
+        (CoreTableAssociation.table_name == TABLE_NAME) & (CoreTableAssociation.table_id == table.c.id)
+    ).outerjoin(CoreTable).filter(table.c.id > after).order_by(table.c.id).limit(limit).all()
+    data = []
+    for row in result:
+        row_dict = dict(zip(columns, row))
+        core = row[-1]
+        core_data = {field: getattr(core, field, None) for field in CoreTable.get_fields()} if core is not None else {}
+        data.append({
+            'id': row_dict.get('id'),
+            'user_data': json.dumps({k: str(v) for k, v in row_dict.items() if k != 'id'}),
+            'core_data': json.dumps(core_data)
+        })
+    db.session.remove()
+    return data
+
+
+def lean_page(table, columns, after, limit):
+    result = db.session.execute(table.select().where(table.c.id > after).order_by(table.c.id).limit(limit)).fetchall()
+    page_ids = [row[0] for row in result]
+    core_by_id = core_data_by_id(db.session.execute(core_data_statement(TABLE_NAME, page_ids)))
+    data = table_payload(columns, result, core_by_id)['rows']
+    db.session.remove()
+    return data
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--width', type=int, default=12)
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+
+    app = bench_app()
+    with app.app_context():
+        db.create_all()
+        print(f"Populating {args.rows} rows x {args.width} columns, all with core data...")
+        table = populate(TABLE_NAME, args.rows, args.rows, width=args.width)
+        columns = [column.name for column in table.columns]
+        after = args.rows // 2
+
+        print(f"{'page size':<12}{'orm join':>12}{'lean':>12}{'speedup':>10}")
+        for limit in (100, 1000, 5000):
+            assert orm_join_page(table, columns, after, limit) == lean_page(table, columns, after, limit)
+            orm_ms = timed(lambda: orm_join_page(table, columns, after, limit), args.repeat)
+            lean_ms = timed(lambda: lean_page(table, columns, after, limit), args.repeat)
+            print(f"{limit:<12}{orm_ms:>10.2f}ms{lean_ms:>10.2f}ms{orm_ms / lean_ms:>9.1f}x")
+
+
+if __name__ == '__main__':
+    main()
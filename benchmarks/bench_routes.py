@@ -0,0 +1,251 @@
+"""Throughput, latency, peak RSS and SQL statements per request for the data routes.
+
+Seeds a synthetic table per scale (see seed_data.seed_synthetic), drives the
+routes through the Flask test client and writes the results as JSON. Runs
+against a fresh SQLite file, plus PostgreSQL when --postgres is given.
+
+Usage: python benchmarks/bench_routes.py [--scale 10k,100k,1m] [--postgres URI]
+           [--requests 200] [--concurrency 1] [--output FILE] [--compare BASELINE]
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from common import bench_app
+import sqlalchemy
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from app import db, schema_registry, table_stats
+from app.models import User
+from seed_data import parse_scale, seed_synthetic
+
+USERNAME = 'bench'
+PASSWORD = 'bench-password'
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+
+_local = threading.local()
+
+
+def _count_statement(conn, cursor, statement, parameters, context, executemany):
+    _local.statements = getattr(_local, 'statements', 0) + 1
+
+
+def statements():
+    return getattr(_local, 'statements', 0)
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def scenarios(table_name, rows):
+    """(name, request function) pairs; each function gets a client and a per-thread Random."""
+    base = f'/get_table_data/{table_name}/spreadsheet?format=columnar&limit=100'
+
+    def login(client, rng):
+        # a logged-in client is only redirected, every login needs fresh cookies
+        return client.application.test_client().post('/login', data={'username': USERNAME, 'password': PASSWORD})
+
+    def first_page(client, rng):
+        return client.get(base)
+
+    def offset_page(client, rng):
+        return client.get(f'{base}&count=none&offset={rng.randrange(rows)}')
+
+    def keyset_page(client, rng):
+        return client.get(f'{base}&count=none&after={rng.randrange(rows)}')
+
+    def search(client, rng):
+        return client.get(f'{base}&q=item {rng.randrange(1, 1000)}')
+
+    def sorted_filtered(client, rng):
+        return client.get(f'{base}&sort=-amount&filter=category:eq:beta')
+
+    def update_row(client, rng):
+        return client.post(f'/update_table_data/{table_name}', json={
+            'id': rng.randrange(1, rows + 1),
+            'user_data': json.dumps({'amount': rng.randrange(100000)}),
+        })
+
+    def add_row(client, rng):
+        return client.post(f'/add_table_data/{table_name}', json={
+            'user_data': json.dumps({'name': f'added {rng.random()}', 'category': 'alpha', 'amount': 1}),
+        })
+
+    return [
+        ('login', login),
+        ('get_table_data:first_page', first_page),
+        ('get_table_data:offset', offset_page),
+        ('get_table_data:keyset', keyset_page),
+        ('get_table_data:search', search),
+        ('get_table_data:sort_filter', sorted_filtered),
+        ('update_table_data', update_row),
+        ('add_table_data', add_row),
+    ]
+
+
+def logged_in_client(app):
+    client = app.test_client()
+    response = client.post('/login', data={'username': USERNAME, 'password': PASSWORD})
+    assert response.status_code == 302, 'benchmark login failed'
+    return client
+
+
+def run_scenario(app, request, count, concurrency, warmup):
+    clients = [logged_in_client(app) for _ in range(concurrency)]
+
+    def worker(index):
+        client, rng = clients[index], random.Random(index)
+        latencies, errors, executed = [], 0, 0
+        for _ in range(warmup):
+            request(client, rng)
+        for _ in range(count // concurrency + (index < count % concurrency)):
+            before = statements()
+            start = time.perf_counter()
+            response = request(client, rng)
+            latencies.append((time.perf_counter() - start) * 1000)
+            executed += statements() - before
+            errors += response.status_code >= 400
+        return latencies, errors, executed
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(worker, range(concurrency)))
+    elapsed = time.perf_counter() - start
+    latencies = [latency for result in results for latency in result[0]]
+    return {
+        'requests': len(latencies),
+        'errors': sum(result[1] for result in results),
+        'throughput_rps': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(percentile(latencies, 0.5), 3),
+        'p99_ms': round(percentile(latencies, 0.99), 3),
+        'mean_ms': round(statistics.fmean(latencies), 3),
+        'statements_per_request': round(sum(result[2] for result in results) / len(latencies), 2),
+        # process high-water mark, so it never goes down between routes
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+
+def run(database, uri, rows, args):
+    app = bench_app(uri, TABLE_STATS_REFRESH_SECONDS=0)
+    schema_registry.invalidate()
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        user = User(username=USERNAME)
+        user.set_password(PASSWORD)
+        db.session.add(user)
+        db.session.commit()
+        start = time.perf_counter()
+        table_name = seed_synthetic(rows, f'bench_{rows}', usernames=(USERNAME,))
+        User.query.filter_by(username=USERNAME).one().set_permissions({
+            table_name: ['view', 'edit'], 'core_table': ['view', 'edit']
+        })
+        db.session.commit()
+        seed_seconds = time.perf_counter() - start
+        # the estimates the background refresh would keep, taken once up front
+        table_stats.refresh([table_name])
+    print(f"{database} {rows} rows: seeded in {seed_seconds:.1f}s")
+
+    routes = {}
+    for name, request in scenarios(table_name, rows):
+        count = args.login_requests if name == 'login' else args.requests
+        routes[name] = result = run_scenario(app, request, count, args.concurrency, args.warmup)
+        print(f"  {name:<28}{result['throughput_rps']:>9.1f} req/s  p50 {result['p50_ms']:>8.2f}ms  "
+              f"p99 {result['p99_ms']:>8.2f}ms  {result['statements_per_request']:>5.1f} stmts  "
+              f"{result['peak_rss_mb']:>7.1f} MB  {result['errors']} errors")
+    with app.app_context():
+        db.engine.dispose()
+    return {'database': database, 'scale': rows, 'seed_seconds': round(seed_seconds, 2), 'routes': routes}
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def compare(results, baseline_path):
+    with open(baseline_path) as f:
+        baseline = {(run['database'], run['scale']): run['routes'] for run in json.load(f)['runs']}
+    print(f"\nCompared with {baseline_path} (negative latency / positive throughput change is better)")
+    for run in results['runs']:
+        old_routes = baseline.get((run['database'], run['scale']))
+        if old_routes is None:
+            continue
+        print(f"{run['database']} {run['scale']} rows")
+        for name, new in run['routes'].items():
+            old = old_routes.get(name)
+            if old is None:
+                continue
+            def change(key):
+                return (new[key] - old[key]) / old[key] * 100 if old[key] else 0.0
+            print(f"  {name:<28}p50 {change('p50_ms'):>+7.1f}%  p99 {change('p99_ms'):>+7.1f}%  "
+                  f"throughput {change('throughput_rps'):>+7.1f}%  statements {new['statements_per_request'] - old['statements_per_request']:>+5.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scale', default='10k', help='comma separated table sizes, e.g. 10k,100k,1m')
+    parser.add_argument('--postgres', default=os.environ.get('BENCH_POSTGRES_URI'),
+                        help='also run against this PostgreSQL database; its tables are dropped')
+    parser.add_argument('--no-sqlite', action='store_true', help='skip the SQLite run')
+    parser.add_argument('--requests', type=int, default=200, help='measured requests per route')
+    parser.add_argument('--login-requests', type=int, default=20, help='measured logins (password hashing is slow)')
+    parser.add_argument('--warmup', type=int, default=5, help='unmeasured requests per client first')
+    parser.add_argument('--concurrency', type=int, default=1, help='client threads per route')
+    parser.add_argument('--output', help='result file, default benchmarks/results/routes-<time>.json')
+    parser.add_argument('--compare', help='earlier result file to print changes against')
+    args = parser.parse_args()
+
+    databases = [] if args.no_sqlite else [('sqlite', None)]
+    if args.postgres:
+        databases.append(('postgresql', args.postgres))
+    event.listen(Engine, 'before_cursor_execute', _count_statement)
+
+    results = {
+        'meta': {
+            'created_at': datetime.now(timezone.utc).isoformat(),
+            'git_commit': git_commit(),
+            'python': platform.python_version(),
+            'sqlalchemy': sqlalchemy.__version__,
+            'platform': platform.platform(),
+            'requests': args.requests,
+            'concurrency': args.concurrency,
+        },
+        'runs': [],
+    }
+    for database, uri in databases:
+        for scale in args.scale.split(','):
+            results['runs'].append(run(database, uri, parse_scale(scale), args))
+
+    output = args.output or os.path.join(RESULTS_DIR, f"routes-{datetime.now():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {output}")
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+
+from sqlalchemy import Column, Integer, MetaData, String, Table, insert
+from config import Config
+from app import create_app, db
+from app.models import CoreTable, CoreTableAssociation
+
+CHUNK = 50000
+OTHER_TABLES = 9
+
+
+def timed(fn, repeat):
+    """Median wall time of `fn` in milliseconds."""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def bench_app(uri=None, **config):
+    """An app on `uri`, or on a fresh SQLite file; `config` overrides settings."""
+    tmpdir = tempfile.mkdtemp()
+
+    class BenchConfig(Config):
+        SQLALCHEMY_DATABASE_URI = uri or 'sqlite:///' + os.path.join(tmpdir, 'bench.db')
+
+    for key, value in config.items():
+        setattr(BenchConfig, key, value)
+    return create_app(BenchConfig)
+
+
+def populate(table_name, rows, associations, width=1):
+    """Create `table_name` with `rows` rows and `width` text columns, plus `associations` core rows.
+
+    The first `rows` associations belong to the table, the rest are spread over
+    other table names so the association table is shared as in production.
+    """
+    columns = [Column(f'col{i}', String(64)) for i in range(width)]
+    table = Table(table_name, MetaData(), Column('id', Integer, primary_key=True), *columns)
+    table.create(db.engine)
+    core = CoreTable.__table__
+    assoc = CoreTableAssociation.__table__
+    with db.engine.begin() as connection:
+        for start in range(0, rows, CHUNK):
+            connection.execute(insert(table), [
+                {'id': i, **{f'col{c}': f'value {i}.{c}' for c in range(width)}}
+                for i in range(start + 1, min(start + CHUNK, rows) + 1)
+            ])
+        for start in range(0, associations, CHUNK):
+            batch = range(start + 1, min(start + CHUNK, associations) + 1)
+            connection.execute(insert(core), [
+                {'id': i, 'reference_id': f'REF{i}', 'common_field1': f'v{i}', 'common_field2': f'w{i}'}
+                for i in batch
+            ])
+            connection.execute(insert(assoc), [{
+                'id': i,
+                'table_name': table_name if i <= rows else f'other_{i % OTHER_TABLES}',
+                'table_id': i if i <= rows else i // OTHER_TABLES,
+                'core_id': i,
+            } for i in batch])
+    return table
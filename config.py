@@ -7,6 +7,81 @@ class Config:
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or \
         'sqlite:///' + os.path.join(basedir, 'instance', 'app.db')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # async routes derive sqlite+aiosqlite / postgresql+asyncpg from the main URI unless set
+    ASYNC_SQLALCHEMY_DATABASE_URI = os.environ.get('ASYNC_DATABASE_URL')
+    # threads serving the Flask routes under asgi.py, like gunicorn --threads
+    ASGI_WSGI_THREADS = int(os.environ.get('ASGI_WSGI_THREADS') or 32)
+    # comma-separated read replica URLs; reads in @read_replica views go there
+    SQLALCHEMY_REPLICA_URIS = [uri for uri in (os.environ.get('DATABASE_REPLICA_URLS') or '').split(',') if uri]
+    REPLICA_READ_AFTER_WRITE_SECONDS = int(os.environ.get('REPLICA_READ_AFTER_WRITE_SECONDS') or 5)
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE') or 5)
+    DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW') or 10)
+    DB_POOL_TIMEOUT = int(os.environ.get('DB_POOL_TIMEOUT') or 30)
+    DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE') or 1800)
+    DB_POOL_PRE_PING = os.environ.get('DB_POOL_PRE_PING', 'true').lower() in ('1', 'true', 'yes')
+    # applied to every new SQLite connection
+    SQLITE_PRAGMAS = {
+        'journal_mode': os.environ.get('SQLITE_JOURNAL_MODE') or 'WAL',
+        'synchronous': os.environ.get('SQLITE_SYNCHRONOUS') or 'NORMAL',
+        'cache_size': int(os.environ.get('SQLITE_CACHE_SIZE') or -64000),
+        'mmap_size': int(os.environ.get('SQLITE_MMAP_SIZE') or 268435456),
+        'busy_timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT') or 5000),
+    }
+    TABLE_PAGE_SIZE = int(os.environ.get('TABLE_PAGE_SIZE') or 100)
+    TABLE_MAX_PAGE_SIZE = int(os.environ.get('TABLE_MAX_PAGE_SIZE') or 1000)
+    EXPORT_CHUNK_ROWS = int(os.environ.get('EXPORT_CHUNK_ROWS') or 1000)
+    BULK_MAX_ROWS = int(os.environ.get('BULK_MAX_ROWS') or 100000)
+    # background refresh of table_metadata row estimates and sizes; 0 disables it
+    TABLE_STATS_REFRESH_SECONDS = int(os.environ.get('TABLE_STATS_REFRESH_SECONDS', 300))
+    # unfiltered tables with fewer estimated rows than this still get an exact count
+    TABLE_STATS_EXACT_BELOW = int(os.environ.get('TABLE_STATS_EXACT_BELOW') or 10000)
+    SQLITE_ANALYSIS_LIMIT = int(os.environ.get('SQLITE_ANALYSIS_LIMIT') or 1000)
+    # background import/export jobs: worker threads, active jobs per user, and where files go
+    JOB_WORKERS = int(os.environ.get('JOB_WORKERS') or 2)
+    JOB_MAX_PER_USER = int(os.environ.get('JOB_MAX_PER_USER') or 2)
+    JOB_DIR = os.environ.get('JOB_DIR') or os.path.join(basedir, 'instance', 'jobs')
+    # live jobs are touched every JOB_HEARTBEAT_SECONDS by the process running them;
+    # uploading or running jobs without a heartbeat for JOB_STALE_SECONDS are failed
+    JOB_HEARTBEAT_SECONDS = int(os.environ.get('JOB_HEARTBEAT_SECONDS') or 30)
+    JOB_STALE_SECONDS = int(os.environ.get('JOB_STALE_SECONDS') or 120)
+    # rows written per transaction by import jobs
+    IMPORT_CHUNK_ROWS = int(os.environ.get('IMPORT_CHUNK_ROWS') or 5000)
+    # JSON array bodies of import jobs are parsed in memory; NDJSON is streamed with no limit
+    IMPORT_MAX_JSON_BYTES = int(os.environ.get('IMPORT_MAX_JSON_BYTES') or 64 * 1024 * 1024)
+    # row change log behind /table_changes; larger writes are logged as one reload marker
+    CHANGE_RETENTION_SECONDS = int(os.environ.get('CHANGE_RETENTION_SECONDS') or 86400)
+    CHANGE_FEED_MAX_ROWS = int(os.environ.get('CHANGE_FEED_MAX_ROWS') or 1000)
+    CHANGE_FEED_SETTLE_SECONDS = int(os.environ.get('CHANGE_FEED_SETTLE_SECONDS') or 2)
+    # server-sent event streams poll the log and end after this long. Each open stream holds
+    # a worker thread, so it is off (0, the dashboard polls) unless the server keeps idle
+    # connections cheaply, e.g. asgi.py or gunicorn with gevent workers
+    CHANGE_STREAM_POLL_SECONDS = float(os.environ.get('CHANGE_STREAM_POLL_SECONDS') or 1)
+    CHANGE_STREAM_SECONDS = int(os.environ.get('CHANGE_STREAM_SECONDS') or 0)
+    # werkzeug hash method and cost, e.g. 'scrypt:16384:8:1' or 'pbkdf2:sha256:600000';
+    # stored hashes with other parameters are rehashed at the next login
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD') or 'scrypt'
+    PASSWORD_SALT_LENGTH = int(os.environ.get('PASSWORD_SALT_LENGTH') or 16)
+    # threads verifying passwords and logins allowed to wait for them; more get a 503
+    PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS') or max(1, (os.cpu_count() or 2) // 2))
+    PASSWORD_HASH_QUEUE = int(os.environ.get('PASSWORD_HASH_QUEUE') or 32)
+    PASSWORD_HASH_TIMEOUT = int(os.environ.get('PASSWORD_HASH_TIMEOUT') or 10)
+    # loaded users are trusted this long before their version is checked again
+    USER_CACHE_SIZE = int(os.environ.get('USER_CACHE_SIZE') or 1024)
+    USER_CACHE_TTL = int(os.environ.get('USER_CACHE_TTL') or 30)
+    # also keep the user in the signed session cookie, for workers that have not loaded it yet
+    USER_SESSION_SNAPSHOT = os.environ.get('USER_SESSION_SNAPSHOT', 'true').lower() in ('1', 'true', 'yes')
+    # Content-Encoding in order of preference; br and zstd need the brotli and zstandard packages
+    COMPRESSION_ENCODINGS = os.environ.get('COMPRESSION_ENCODINGS', 'zstd,br,gzip')
+    # buffered responses smaller than this are not worth compressing
+    COMPRESSION_MIN_BYTES = int(os.environ.get('COMPRESSION_MIN_BYTES') or 1024)
+    SCHEMA_CACHE_TTL = int(os.environ.get('SCHEMA_CACHE_TTL') or 300)
+    # compiled INSERT/UPDATE constructs kept per table and column set
+    STATEMENT_CACHE_SIZE = int(os.environ.get('STATEMENT_CACHE_SIZE') or 256)
+    SLOW_QUERY_THRESHOLD_MS = int(os.environ.get('SLOW_QUERY_THRESHOLD_MS') or 500)
+    # /metrics answers scrapers sending `Authorization: Bearer <METRICS_TOKEN>`, or clients whose
+    # address is in METRICS_ALLOWED_IPS (only safe without a reverse proxy); with neither it is off
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+    METRICS_ALLOWED_IPS = [ip.strip() for ip in (os.environ.get('METRICS_ALLOWED_IPS') or '').split(',') if ip.strip()]
 
     @staticmethod
     def init_app(app):
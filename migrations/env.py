@@ -106,6 +106,11 @@ def run_migrations_online():
         with context.begin_transaction():
             context.run_migrations()
 
+    # reflected user tables may have changed shape
+    registry = current_app.extensions.get('schema_registry')
+    if registry is not None:
+        registry.invalidate()
+
 
 if context.is_offline_mode():
     run_migrations_offline()
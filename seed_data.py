@@ -1,6 +1,110 @@
-from app import create_app, db
+from app import create_app, db, schema_registry, change_feed, core_projection
 from app.models import User, TableMetadata, CoreTable, CoreTableAssociation
+from datetime import datetime, timedelta
+from sqlalchemy import Column, DateTime, Float, Integer, MetaData, String, Table, func, insert, select
+import argparse
 import json
+import random
+
+SYNTHETIC_CHUNK = 50000
+SYNTHETIC_CATEGORIES = ['alpha', 'beta', 'gamma', 'delta', 'epsilon', 'zeta', 'eta', 'theta']
+
+def parse_scale(value):
+    """'10k', '100k', '1m' or a plain number of rows."""
+    value = value.strip().lower()
+    multiplier = {'k': 1000, 'm': 1000000}.get(value[-1:], 1)
+    return int(float(value[:-1] if multiplier > 1 else value) * multiplier)
+
+def _synthetic_rows(first, last, rng):
+    start = datetime(2020, 1, 1)
+    return [{
+        'id': i,
+        'name': f'item {i}',
+        'category': rng.choice(SYNTHETIC_CATEGORIES),
+        'amount': rng.randint(0, 100000),
+        'score': round(rng.random() * 100, 3),
+        'created_at': start + timedelta(minutes=i),
+    } for i in range(first, last + 1)]
+
+def _reset_sequence(connection, table):
+    # explicit ids leave PostgreSQL's serial sequence behind
+    if connection.dialect.name == 'postgresql':
+        connection.exec_driver_sql(
+            f"SELECT setval(pg_get_serial_sequence('{table.name}', 'id'), (SELECT MAX(id) FROM {table.name}))"
+        )
+
+def seed_synthetic(rows, table_name=None, core_fraction=0.5, usernames=('admin',), seed=0):
+    """Create a synthetic user table with `rows` rows, core data for `core_fraction`
+    of them, its table_metadata row and view/edit access for `usernames`.
+
+    Runs inside an app context; an existing table of the same name is replaced,
+    together with the core rows only it used.
+    """
+    table_name = table_name or f'synthetic_{rows}'
+    rng = random.Random(seed)
+    table = Table(
+        table_name, MetaData(),
+        Column('id', Integer, primary_key=True),
+        Column('name', String(64), nullable=False),
+        Column('category', String(32)),
+        Column('amount', Integer),
+        Column('score', Float),
+        Column('created_at', DateTime),
+    )
+    table.drop(db.engine, checkfirst=True)
+    table.create(db.engine)
+    core = CoreTable.__table__
+    assoc = CoreTableAssociation.__table__
+    with db.engine.begin() as connection:
+        shared = select(assoc.c.core_id).where(assoc.c.table_name != table_name, assoc.c.core_id.is_not(None))
+        connection.execute(core.delete().where(
+            core.c.id.in_(select(assoc.c.core_id).where(assoc.c.table_name == table_name)),
+            core.c.id.not_in(shared)
+        ))
+        connection.execute(assoc.delete().where(assoc.c.table_name == table_name))
+        for first in range(1, rows + 1, SYNTHETIC_CHUNK):
+            connection.execute(insert(table), _synthetic_rows(first, min(first + SYNTHETIC_CHUNK - 1, rows), rng))
+        _reset_sequence(connection, table)
+
+        # every n-th row gets core data, spread evenly over the table
+        step = max(1, round(1 / core_fraction)) if core_fraction > 0 else None
+        linked = list(range(1, rows + 1, step)) if step else []
+        core_start = (connection.execute(select(func.max(core.c.id))).scalar() or 0) + 1
+        assoc_start = (connection.execute(select(func.max(assoc.c.id))).scalar() or 0) + 1
+        for offset in range(0, len(linked), SYNTHETIC_CHUNK):
+            batch = linked[offset:offset + SYNTHETIC_CHUNK]
+            connection.execute(insert(core), [{
+                'id': core_start + offset + n,
+                'reference_id': f'{table_name}-{row_id}',
+                'common_field1': rng.choice(SYNTHETIC_CATEGORIES),
+                'common_field2': f'value {row_id}',
+            } for n, row_id in enumerate(batch)])
+            connection.execute(insert(assoc), [{
+                'id': assoc_start + offset + n,
+                'table_name': table_name,
+                'table_id': row_id,
+                'core_id': core_start + offset + n,
+            } for n, row_id in enumerate(batch)])
+        _reset_sequence(connection, core)
+        _reset_sequence(connection, assoc)
+
+    if not TableMetadata.query.filter_by(table_name=table_name).first():
+        db.session.add(TableMetadata(table_name=table_name, description=f'Synthetic data, {rows} rows'))
+    for user in User.query.filter(User.username.in_(usernames)):
+        tables = user.get_accessible_tables()
+        if table_name not in tables:
+            user.set_accessible_tables(tables + [table_name])
+        permissions = user.get_permissions()
+        permissions[table_name] = ['view', 'edit']
+        user.set_permissions(permissions)
+    schema_registry.invalidate()
+    db.session.flush()
+    TableMetadata.bump_version(table_name)
+    change_feed.record(table_name, op='reload')
+    core_projection.reload(table_name)
+    core_projection.sync(table_name)
+    db.session.commit()
+    return table_name
 
 def seed_database():
     app = create_app()
@@ -94,8 +198,20 @@ def seed_database():
         db.session.add_all(associations)
 
         db.session.commit()
+        schema_registry.invalidate()
 
         print("Database seeded successfully!")
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Seed users and sample tables, optionally with synthetic tables.')
+    parser.add_argument('--synthetic', action='append', default=[], metavar='SIZE',
+                        help='add a synthetic table of SIZE rows (e.g. 10k, 100k, 1m); repeatable')
+    parser.add_argument('--core-fraction', type=float, default=0.5, help='share of synthetic rows with core data')
+    args = parser.parse_args()
     seed_database()
+    if args.synthetic:
+        app = create_app()
+        with app.app_context():
+            for size in args.synthetic:
+                table_name = seed_synthetic(parse_scale(size), core_fraction=args.core_fraction)
+                print(f"Created {table_name}")